@@ -1,78 +1,218 @@
 import numpy as np
 import settings
 import logging
+import time
 from datetime import datetime, UTC
 import humanize
 
+# Numba is optional; without it, the JIT-compiled kernels below are not used and the equivalent NumPy expressions are
+# used instead
+try:
+    from numba import njit, prange
+    _numba_available = True
+except ImportError:
+    _numba_available = False
+    prange = range
+    
+    def njit(*args, **kwargs):
+        return lambda function: function
+
+
+@njit(cache=True, fastmath=True, parallel=True)
+def _compute_cell_commands(m: np.ndarray, b: np.ndarray, voltages: np.ndarray, rail_reading_5V: float, max_command: int) -> np.ndarray:
+    # Inputs have shape (N_series, N_parallel); m holds the cell slopes, or the slopes already divided by the 5V rail
+    # reading when rail_reading_5V is 1. Each series group is independent, so they are computed in parallel
+    commands = np.empty(voltages.shape, dtype=np.int32)
+    for idx_cell_series in prange(voltages.shape[0]):
+        for idx_cell_parallel in range(voltages.shape[1]):
+            # Round to the nearest integer DAC command, then clip it to the DAC's range
+            command = int(voltages[idx_cell_series, idx_cell_parallel] * m[idx_cell_series, idx_cell_parallel] /
+                          rail_reading_5V + b[idx_cell_series, idx_cell_parallel] + 0.5)
+            commands[idx_cell_series, idx_cell_parallel] = min(max(command, 0), max_command)
+    
+    return commands
+
+
+@njit(cache=True, parallel=True)
+def _fit_channels(x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Inputs have shape (N_samples, N_series, N_parallel); each channel gets a least-squares fit y = m * x + b, computed
+    # from running sums in a single pass over its samples
+    sample_count, series_count, parallel_count = x.shape
+    m = np.empty((series_count, parallel_count), dtype=np.float32)
+    b = np.empty((series_count, parallel_count), dtype=np.float32)
+    for idx_cell_series in prange(series_count):
+        for idx_cell_parallel in range(parallel_count):
+            sum_x = sum_y = sum_xx = sum_xy = 0.
+            for idx_sample in range(sample_count):
+                x_sample = x[idx_sample, idx_cell_series, idx_cell_parallel]
+                y_sample = y[idx_sample, idx_cell_series, idx_cell_parallel]
+                sum_x += x_sample
+                sum_y += y_sample
+                sum_xx += x_sample * x_sample
+                sum_xy += x_sample * y_sample
+            
+            # Closed-form solution for the linear regression coefficients; channels whose measured voltage never changed
+            # can't be fit, so they get NaN coefficients (see fit_cell_calibration())
+            denominator = sample_count * sum_xx - sum_x * sum_x
+            m_channel = (sample_count * sum_xy - sum_x * sum_y) / denominator if denominator != 0. else np.nan
+            m[idx_cell_series, idx_cell_parallel] = m_channel
+            b[idx_cell_series, idx_cell_parallel] = (sum_y - m_channel * sum_x) / sample_count
+    
+    return m, b
+
 
 class calibration():
     def __init__(self) -> None:
-        # Shape is (N_series, N_parallel, 2), where linear regression coefficients m, b are at indexes 0 and 1,
-        # respectively, in dimension 2
-        self._cell_cal_matrix = None
+        # Shapes are (N_series, N_parallel), holding the linear regression coefficients m and b, respectively, for each
+        # cell; m and b are kept in separate arrays so that batch computations read each one contiguously
+        self._cell_m = None
+        self._cell_b = None
         
-        # Shape is (N_series, 2), where linear regression coefficients m, b are at indexes 0 and 1, respectively, in
-        # dimension 1
-        self._temp_cal_matrix = None
+        # Shapes are (N_series), holding the linear regression coefficients m and b, respectively, for each temperature
+        # output
+        self._temp_m = None
+        self._temp_b = None
         
         # Shapes are (2), where linear regression coefficients m, b are at indexes 0 and 1, respectively
         self._sense_5V_cal = None
         self._sense_24V_cal = None
         
+        # Plain Python copies of the above coefficients, used by the per-command getters so that each DAC command
+        # doesn't pay for NumPy indexing and scalar boxing; kept in sync by _update_coefficient_cache()
+        self._cell_m_cache = None
+        self._cell_b_cache = None
+        self._temp_m_cache = None
+        self._temp_b_cache = None
+        self._sense_5V_m = None
+        self._sense_5V_b = None
+        self._sense_24V_m = None
+        self._sense_24V_b = None
+        
+        # The 5V rail reading set with set_rail_5V(), along with the cell and temperature slopes pre-multiplied (in
+        # float64) by its reciprocal so that computing a DAC command without a rail reading doesn't need a division
+        self._rail_reading_5V = None
+        self._cell_m_scaled = None
+        self._cell_m_scaled_cache = None
+        self._temp_m_scaled_cache = None
+        
+        # Resolution of the cell DAC, used to clip batch-computed commands to the valid DAC range
+        self._DAC_bits_cell = 12
+        
+        # The time of the last saved calibration, and the most recent (time.monotonic() timestamp, string) result of
+        # time_since_last_calibration(); kept in sync by _load_last_calibrated_time()
+        self._last_calibrated_dt = None
+        self._last_humanized = (None, None)
+        
+        # Whether all of the above calibrations are present; kept in sync by _update_coefficient_cache()
+        self._cal_ready = False
+        
         # Load the calibration profile stored in settings
         self.load_calibration()
     
     
     @property
     def calibration_loaded(self) -> bool:
-        return not (self._cell_cal_matrix is None or
-                    self._temp_cal_matrix is None or
-                    self._sense_5V_cal is None or
-                    self._sense_24V_cal is None)
+        return self._cal_ready
+    
+    
+    def set_rail_5V(self, rail_reading_5V: float) -> None:
+        """Sets the 5V rail reading which DAC commands are computed relative to when the DAC command getters aren't
+        passed one. This is useful when the rail is measured separately from when commands are computed; a rail reading
+        passed to a getter is only used for that call.
+        """
+        
+        # Make sure the calibration matrixes exists
+        if not self._cal_ready:
+            raise ValueError("No calibration found, load with use_default_calibration() or load_calibration()")
+        
+        # Fold the reciprocal of the rail reading into the slopes once, rather than dividing for every DAC command
+        rail_scale = 1.0 / rail_reading_5V
+        self._rail_reading_5V = rail_reading_5V
+        self._cell_m_scaled = self._cell_m.astype(np.float64) * rail_scale
+        self._cell_m_scaled_cache = self._cell_m_scaled.tolist()
+        self._temp_m_scaled_cache = [m * rail_scale for m in self._temp_m_cache]
     
     
-    def get_temp_command(self, idx_cell_series: int, target_voltage: float, rail_reading_5V: float) -> int:
+    def _check_rail_5V(self, rail_reading_5V: float | None) -> None:
         # Make sure the calibration matrixes exists
-        if not self.calibration_loaded:
+        if not self._cal_ready:
             raise ValueError("No calibration found, load with use_default_calibration() or load_calibration()")
         
-        # Use the calibration matrix to get the target DAC command
-        cal_coefficients = self._temp_cal_matrix[idx_cell_series, :]
-        target_command = target_voltage * cal_coefficients[0] / rail_reading_5V + cal_coefficients[1]
+        # Commands are computed from the rail reading passed to the getter if there is one, otherwise from the rail
+        # reading set with set_rail_5V()
+        if rail_reading_5V is None and self._rail_reading_5V is None:
+            raise ValueError("No 5V rail reading found, pass one to this method or set it with set_rail_5V()")
+    
+    
+    def get_temp_command(self, idx_cell_series: int, target_voltage: float, rail_reading_5V: float | None = None) -> int:
+        # Make sure the calibration and a 5V rail reading exist
+        self._check_rail_5V(rail_reading_5V)
         
-        # Round the command to the nearest integer for the actual DAC command
-        return round(target_command)
+        # Use the cached calibration coefficients to get the target DAC command, rounded to the nearest integer
+        if rail_reading_5V is not None:
+            return round(target_voltage * self._temp_m_cache[idx_cell_series] / rail_reading_5V +
+                         self._temp_b_cache[idx_cell_series])
+        return round(target_voltage * self._temp_m_scaled_cache[idx_cell_series] + self._temp_b_cache[idx_cell_series])
 
     
-    def get_cell_command(self, idx_cell_series: int, idx_cell_parallel: int, target_voltage: float, rail_reading_5V: float) -> int:
-        # Make sure the calibration matrixes exists
-        if not self.calibration_loaded:
-            raise ValueError("No calibration found, load with use_default_calibration() or load_calibration()")
+    def get_cell_command(self, idx_cell_series: int, idx_cell_parallel: int, target_voltage: float, rail_reading_5V: float | None = None) -> int:
+        # Make sure the calibration and a 5V rail reading exist
+        self._check_rail_5V(rail_reading_5V)
         
-        # Use the calibration matrix to get the target DAC command
-        cal_coefficients = self._cell_cal_matrix[idx_cell_series, idx_cell_parallel, :]
-        target_command = target_voltage * cal_coefficients[0] / rail_reading_5V + cal_coefficients[1]
+        # Use the cached calibration coefficients to get the target DAC command, rounded to the nearest integer
+        if rail_reading_5V is not None:
+            return round(target_voltage * self._cell_m_cache[idx_cell_series][idx_cell_parallel] / rail_reading_5V +
+                         self._cell_b_cache[idx_cell_series][idx_cell_parallel])
+        return round(target_voltage * self._cell_m_scaled_cache[idx_cell_series][idx_cell_parallel] +
+                     self._cell_b_cache[idx_cell_series][idx_cell_parallel])
+
+
+    def get_cell_commands(self, target_voltages: np.ndarray, rail_reading_5V: float | None = None) -> np.ndarray:
+        """Computes the DAC commands for an entire frame of cell voltages at once. `target_voltages` must have shape
+        (N_series, N_parallel), matching the calibration; the returned commands have the same shape.
+        """
+
+        # Make sure the calibration and a 5V rail reading exist
+        self._check_rail_5V(rail_reading_5V)
+        
+        # The JIT-compiled kernel doesn't check bounds, so make sure the frame matches the calibration before using it
+        target_voltages = np.asarray(target_voltages, dtype=np.float64)
+        if target_voltages.shape != self._cell_m.shape:
+            raise ValueError(f"Target voltages have shape {target_voltages.shape}, but the calibration has shape {self._cell_m.shape}")
+
+        # Use the JIT-compiled kernel if it's available, since it computes each command in a single pass
+        max_command = (1 << self._DAC_bits_cell) - 1
+        if _numba_available:
+            if rail_reading_5V is not None:
+                return _compute_cell_commands(self._cell_m, self._cell_b, target_voltages, rail_reading_5V, max_command)
+            return _compute_cell_commands(self._cell_m_scaled, self._cell_b, target_voltages, 1.0, max_command)
         
-        # Round the command to the nearest integer for the actual DAC command
-        return round(target_command)
+        # Otherwise, apply the calibration to every cell in one pass, then round to the nearest integer DAC commands
+        # (adding 0.5 before truncating is equivalent to rounding for the non-negative commands which survive clipping)
+        # and clip them to the DAC's range
+        if rail_reading_5V is not None:
+            target_commands = target_voltages * self._cell_m / rail_reading_5V + self._cell_b
+        else:
+            target_commands = target_voltages * self._cell_m_scaled + self._cell_b
+        return np.clip((target_commands + 0.5).astype(np.int32), 0, max_command)
 
 
     def get_voltage_5V(self, sense_5V_ADC_reading: float) -> float:
         # Make sure the calibration matrixes exists
-        if not self.calibration_loaded:
+        if not self._cal_ready:
             raise ValueError("No calibration found, load with use_default_calibration() or load_calibration()")
         
         # Calibrate the ADC reading
-        return self._sense_5V_cal[0] * sense_5V_ADC_reading + self._sense_5V_cal[1]
+        return self._sense_5V_m * sense_5V_ADC_reading + self._sense_5V_b
     
     
     def get_voltage_24V(self, sense_24V_ADC_reading: float) -> float:
         # Make sure the calibration matrixes exists
-        if not self.calibration_loaded:
+        if not self._cal_ready:
             raise ValueError("No calibration found, load with use_default_calibration() or load_calibration()")
         
         # Calibrate the ADC reading
-        return self._sense_24V_cal[0] * sense_24V_ADC_reading + self._sense_24V_cal[1]
+        return self._sense_24V_m * sense_24V_ADC_reading + self._sense_24V_b
 
     
     def use_default_calibration(self,
@@ -87,32 +227,44 @@ class calibration():
                                 sense_24V_R_L: float = 1.,
                                 sense_24V_R_H: float = 10.) -> None:
         
+        self._DAC_bits_cell = DAC_bits_cell
+        
         # The temperature DAC slope is determined only by the number of DAC bits
-        m_temp = 2 ** DAC_bits_temp
+        m_temp = float(1 << DAC_bits_temp)
         
         # The cell DAC slope is determined by the number of DAC bits and by the op amp resistors
-        m_cell = (2 ** DAC_bits_cell) / (1 + cell_amp_R_H / cell_amp_R_L)
+        cell_amp_gain = 1.0 + cell_amp_R_H / cell_amp_R_L
+        m_cell = (1 << DAC_bits_cell) / cell_amp_gain
         
-        # Create the calibration matrixes for one set of parallel cells and temperature output
-        cal_parallel_cell = np.zeros((cell_count_parallel, 2))
-        cal_parallel_cell[:, 0] = m_cell
-        cal_single_temp = np.zeros((2))
-        cal_single_temp[0] = m_temp
+        # Construct the full calibration matrixes; by default, every cell and temperature output shares the same slope
+        # and has no offset, so these are read-only broadcast views of a single value rather than full allocations (see
+        # _materialize_calibration() for getting writable copies)
+        cell_shape = (cell_count_series, cell_count_parallel)
+        temp_shape = (cell_count_series,)
+        self._cell_m = np.broadcast_to(np.float32(m_cell), cell_shape)
+        self._cell_b = np.broadcast_to(np.float32(0), cell_shape)
+        self._temp_m = np.broadcast_to(np.float32(m_temp), temp_shape)
+        self._temp_b = np.broadcast_to(np.float32(0), temp_shape)
         
-        # Construct the full calibration matrixes
-        self._cell_cal_matrix = np.repeat(cal_parallel_cell[None, ...], cell_count_series, axis=0)
-        self._temp_cal_matrix = np.repeat(cal_single_temp[None, ...], cell_count_series, axis=0)
+        # Add calibrations for 5V and 24V rail monitor, which stay in float64 since they scale the rail readings which
+        # every cell and temperature command is computed relative to
+        self._sense_5V_cal = np.array([(1 + sense_5V_R_H / sense_5V_R_L), 0], dtype=np.float64)
+        self._sense_24V_cal = np.array([(1 + sense_24V_R_H / sense_24V_R_L), 0], dtype=np.float64)
         
-        # Add calibrations for 5V and 24V rail monitor
-        self._sense_5V_cal = np.array([(1 + sense_5V_R_H / sense_5V_R_L), 0])
-        self._sense_24V_cal = np.array([(1 + sense_24V_R_H / sense_24V_R_L), 0])
+        # Refresh the plain Python coefficients used by the per-command getters
+        self._update_coefficient_cache()
 
 
-    def _get_calibration_matrix(setting_key: str) -> np.array(float):
+    @staticmethod
+    def _get_calibration_matrix(setting_key: str, dtype: type = np.float32) -> np.array(float):
+        # Settings which were never overwritten still hold the default object itself, so an identity check is enough to
+        # detect them without structurally comparing nested lists
         new_cal_matrix = settings.current_settings[setting_key]
-        if not new_cal_matrix == settings._default_settings[setting_key]:
+        if new_cal_matrix is not settings._default_settings[setting_key]:
             try:
-                new_cal_matrix = np.array(new_cal_matrix).astype(float)
+                # Convert straight to a C-contiguous array in a single pass; float32 is plenty for the 12-bit DAC
+                # calibrations, but the rail monitor calibrations are loaded as float64
+                new_cal_matrix = np.asarray(new_cal_matrix, dtype=dtype, order="C")
             except ValueError as e:
                 logging.info(f"Could not create {setting_key} calibration matrix due to the following error: '{e}'. Defaulting to no calibration.")
                 new_cal_matrix = None
@@ -120,40 +272,160 @@ class calibration():
         return new_cal_matrix
 
 
+    @staticmethod
+    def _to_settings_list(cal_matrix: np.ndarray) -> list:
+        # Converting float32 values straight to Python floats keeps their binary round-off (e.g. 0.1 becomes
+        # 0.10000000149011612), so go through their shortest string representations instead, which still load back to
+        # exactly the same float32 values; float64 values are already exact as Python floats
+        if cal_matrix.dtype == np.float64:
+            return cal_matrix.tolist()
+        return cal_matrix.astype(str).astype(float).tolist()
+
+
     def load_calibration(self) -> None:
         """Loads cell, temp, and rail monitor calibration data from the settings module. This requires settings to be
         initialized with `load_saved_settings()` or `load_default_settings()`.
         """
         
-        self._cell_cal_matrix = calibration._get_calibration_matrix(settings._key_cal_cell)
-        self._temp_cal_matrix = calibration._get_calibration_matrix(settings._key_cal_temp)
-        self._sense_5V_cal = calibration._get_calibration_matrix(settings._key_cal_5V)
-        self._sense_24V_cal = calibration._get_calibration_matrix(settings._key_cal_24V)
+        # Parse the time of the last calibration once, rather than every time it's displayed
+        self._load_last_calibrated_time()
         
+        self._cell_m = calibration._get_calibration_matrix(settings._key_cal_cell_m)
+        self._cell_b = calibration._get_calibration_matrix(settings._key_cal_cell_b)
+        self._temp_m = calibration._get_calibration_matrix(settings._key_cal_temp_m)
+        self._temp_b = calibration._get_calibration_matrix(settings._key_cal_temp_b)
+        self._sense_5V_cal = calibration._get_calibration_matrix(settings._key_cal_5V, np.float64)
+        self._sense_24V_cal = calibration._get_calibration_matrix(settings._key_cal_24V, np.float64)
         
+        # Refresh the plain Python coefficients used by the per-command getters
+        self._update_coefficient_cache()
+    
+    
+    def _update_coefficient_cache(self) -> None:
+        # Check whether every calibration is present
+        self._cal_ready = not (self._cell_m is None or
+                               self._cell_b is None or
+                               self._temp_m is None or
+                               self._temp_b is None or
+                               self._sense_5V_cal is None or
+                               self._sense_24V_cal is None)
+        
+        # If any calibration is missing, the getters will refuse to run anyways, so there is nothing to cache
+        if not self._cal_ready:
+            self._cell_m_cache = self._cell_b_cache = self._temp_m_cache = self._temp_b_cache = None
+            self._sense_5V_m = self._sense_5V_b = self._sense_24V_m = self._sense_24V_b = None
+            self._rail_reading_5V = self._cell_m_scaled = self._cell_m_scaled_cache = self._temp_m_scaled_cache = None
+            return
+        
+        # Convert each calibration matrix into (nested) lists of Python floats
+        self._cell_m_cache = self._cell_m.tolist()
+        self._cell_b_cache = self._cell_b.tolist()
+        self._temp_m_cache = self._temp_m.tolist()
+        self._temp_b_cache = self._temp_b.tolist()
+        self._sense_5V_m, self._sense_5V_b = self._sense_5V_cal.tolist()
+        self._sense_24V_m, self._sense_24V_b = self._sense_24V_cal.tolist()
+        
+        # The rail-scaled slopes depend on the calibration too, so rescale them if a rail reading was set
+        if self._rail_reading_5V is not None:
+            self.set_rail_5V(self._rail_reading_5V)
+        
+    
     
     def save_calibration(self) -> None:
         """Saves cell and temp calibration data to the settings module. `settings.save_current_settings()` must be
         called to actually save the calibration data to the disk.
         """
         
-        settings.current_settings[settings._key_cal_cell] = self._cell_cal_matrix.tolist()
-        settings.current_settings[settings._key_cal_temp] = self._temp_cal_matrix.tolist()
-        settings.current_settings[settings._key_cal_5V] = self._sense_5V_cal.tolist()
-        settings.current_settings[settings._key_cal_24V] = self._sense_24V_cal.tolist()
+        settings.current_settings[settings._key_cal_cell_m] = calibration._to_settings_list(self._cell_m)
+        settings.current_settings[settings._key_cal_cell_b] = calibration._to_settings_list(self._cell_b)
+        settings.current_settings[settings._key_cal_temp_m] = calibration._to_settings_list(self._temp_m)
+        settings.current_settings[settings._key_cal_temp_b] = calibration._to_settings_list(self._temp_b)
+        settings.current_settings[settings._key_cal_5V] = calibration._to_settings_list(self._sense_5V_cal)
+        settings.current_settings[settings._key_cal_24V] = calibration._to_settings_list(self._sense_24V_cal)
         settings.current_settings[settings._key_last_calibrated] = str(datetime.now(UTC))
+        self._load_last_calibrated_time()
         
     
-    def time_since_last_calibration(self) -> str:
+    def _load_last_calibrated_time(self) -> None:
         try:
-            # Give a human-readable time since last calibration
-            last_calibrated_time = datetime.fromisoformat(settings.current_settings[settings._key_last_calibrated])
-            time_since_last_calibrated = datetime.now(UTC) - last_calibrated_time
-            return humanize.naturaldelta(time_since_last_calibrated)
-        except:
-            # These exceptions may come from settings, datetime, or humanize, and really should be enumerated; but I
-            # can't be bothered at the moment
+            self._last_calibrated_dt = datetime.fromisoformat(settings.current_settings[settings._key_last_calibrated])
+            
+            # The timestamp is always in UTC, even if it was saved without a timezone
+            if self._last_calibrated_dt.tzinfo is None:
+                self._last_calibrated_dt = self._last_calibrated_dt.replace(tzinfo=UTC)
+        except (KeyError, TypeError, ValueError):
+            # The timestamp is missing or corrupted
+            self._last_calibrated_dt = None
+        
+        # Invalidate the cached human-readable time since last calibration
+        self._last_humanized = (None, None)
+    
+    
+    def time_since_last_calibration(self) -> str:
+        if self._last_calibrated_dt is None:
             return None
+        
+        # The human-readable time only changes slowly, so reuse it if it was computed within the last second
+        now = time.monotonic()
+        last_humanized_time, last_humanized = self._last_humanized
+        if last_humanized_time is not None and now - last_humanized_time < 1.0:
+            return last_humanized
+        
+        # Give a human-readable time since last calibration
+        time_since_last_calibrated = datetime.now(UTC) - self._last_calibrated_dt
+        last_humanized = humanize.naturaldelta(time_since_last_calibrated)
+        self._last_humanized = (now, last_humanized)
+        return last_humanized
+
+
+    def _materialize_calibration(self) -> None:
+        # The default calibration is stored as read-only broadcast views; replace any of those with real, writable
+        # C-contiguous arrays before per-cell calibration values are written to them
+        self._cell_m, self._cell_b, self._temp_m, self._temp_b = (
+            cal if cal.flags.writeable else cal.copy() for cal in (self._cell_m, self._cell_b, self._temp_m, self._temp_b))
+
+
+    def fit_cell_calibration(self, commands: np.ndarray, measured_voltages: np.ndarray, rail_readings_5V: np.ndarray | float) -> None:
+        """Fits a new calibration for every cell from a sweep of DAC commands and the cell voltages they produced.
+        `commands` and `measured_voltages` must have shape (N_samples, N_series, N_parallel); `rail_readings_5V` is
+        either a single 5V rail reading or one reading per sample, with shape (N_samples).
+        """
+        
+        # Make sure the calibration matrixes exists
+        if not self._cal_ready:
+            raise ValueError("No calibration found, load with use_default_calibration() or load_calibration()")
+        
+        # Commands are linear in the ratio between the cell voltage and the 5V rail
+        x = np.asarray(measured_voltages, dtype=np.float64) / np.reshape(rail_readings_5V, (-1, 1, 1))
+        y = np.asarray(commands, dtype=np.float64)
+        
+        # A line can't be fit through fewer than two samples; check here, since the JIT-compiled kernel and the NumPy sums
+        # would otherwise fail differently
+        if x.shape[0] < 2:
+            raise ValueError(f"At least two samples are needed to fit a calibration, but {x.shape[0]} were given")
+        
+        # Fit each channel using the JIT-compiled kernel if it's available, otherwise use the equivalent NumPy sums
+        if _numba_available:
+            m, b = _fit_channels(x, y)
+        else:
+            sample_count = x.shape[0]
+            sum_x, sum_y = x.sum(axis=0), y.sum(axis=0)
+            denominator = sample_count * (x * x).sum(axis=0) - sum_x * sum_x
+            with np.errstate(divide="ignore", invalid="ignore"):
+                m = np.where(denominator != 0., (sample_count * (x * y).sum(axis=0) - sum_x * sum_y) / denominator, np.nan)
+            b = (sum_y - m * sum_x) / sample_count
+        
+        # A cell which couldn't be fit, or whose commands didn't change its voltage, would leave it uncalibrated, so keep
+        # the existing calibration and report the problem cells instead
+        uncalibrated_cells = np.argwhere(~np.isfinite(m) | (m == 0.))
+        if len(uncalibrated_cells):
+            raise ValueError(f"Could not fit a calibration for the following (series, parallel) cells, since their commands or measured voltages did not vary: {[tuple(cell) for cell in uncalibrated_cells.tolist()]}")
+        
+        # Write the new calibration in place, then refresh everything which is derived from it
+        self._materialize_calibration()
+        self._cell_m[...] = m
+        self._cell_b[...] = b
+        self._update_coefficient_cache()
 
 
     def auto_calibrate(self) -> None:
@@ -1,14 +1,31 @@
 import tkinter as tk
 from tkinter import Misc, ttk, messagebox
 from serial import Serial, SerialException
-from serial.tools.list_ports import comports
-from serial.tools.list_ports_common import ListPortInfo
+# lsports is a faster drop-in replacement for pyserial's port enumeration; use it if it's installed
+try:
+    from lsports import comports
+except ImportError:
+    from serial.tools.list_ports import comports
 import logging
-from typing import Callable
+import time
+import asyncio
+import concurrent.futures
+from typing import Callable, Coroutine, TYPE_CHECKING
+# ListPortInfo is only used for type hints, so don't import it at runtime
+if TYPE_CHECKING:
+    from serial.tools.list_ports_common import ListPortInfo
 import settings
 from calibration import calibration
 
 
+# (vendor ID, product ID) pairs of Pi Pico devices running MicroPython; see this page for details:
+# https://github.com/raspberrypi/usb-pid
+_RPI_MICROPYTHON_IDS = frozenset({(0x2E8A, 0x0005)})
+
+# Size of the OS receive and transmit buffers for the serial connection to the test board (bytes), where supported
+_SERIAL_BUFFER_SIZE = 65536
+
+
 class main:
     def __init__(self) -> None:
         # Load settings from settings.json
@@ -27,36 +44,84 @@ class main:
         # Connect
         self.tab_connect = view_connect(self.notebook, self.update_tab_selectable_state)
         self.notebook.add(self.tab_connect.frm, text="Connect")
-        # Calibration
-        self.tab_calibration = view_calibration(self.notebook)
-        self.notebook.add(self.tab_calibration.frm, text="Calibration")
+        # Calibration (only built once the tab is first selected, see _maybe_build_calibration_tab())
+        self.tab_calibration = None
+        self._calibration_container = ttk.Frame(self.notebook)
+        self.notebook.add(self._calibration_container, text="Calibration")
+        self.notebook.bind("<<NotebookTabChanged>>", self._maybe_build_calibration_tab)
         
         # Make tabs selectable only once the relevant conditions are met
+        self._last_tab_state = None
         self.update_tab_selectable_state()
         
         # Register shutdown tasks
         self.root.protocol("WM_DELETE_WINDOW", self.shutdown_tasks)
         
+        # Tk can't await anything, so an asyncio event loop is run alongside it in short bursts from the Tk event loop
+        # while it has tasks to run (see _pump_event_loop()); coroutines should be scheduled on it with create_task()
+        self.event_loop = asyncio.new_event_loop()
+        self._event_loop_pumping = False
+        
         # Start the GUI
         self.root.mainloop()
     
     
+    def create_task(self, coro: Coroutine) -> asyncio.Task:
+        """Schedules a coroutine to run on the asyncio event loop alongside Tk, and makes sure the event loop is being
+        run until it finishes.
+        """
+        task = self.event_loop.create_task(coro)
+        if not self._event_loop_pumping:
+            self._event_loop_pumping = True
+            self.root.after_idle(self._pump_event_loop)
+        return task
+    
+    
+    def _pump_event_loop(self):
+        # A nested Tk event loop (e.g. a dialog opened by a coroutine) can get here while the asyncio event loop is
+        # already running further up the stack; the outer call reschedules the pump once it returns
+        if self.event_loop.is_running():
+            return
+        
+        try:
+            # Run everything which is currently ready on the asyncio event loop, then hand control back to Tk
+            self.event_loop.call_soon(self.event_loop.stop)
+            self.event_loop.run_forever()
+        
+        finally:
+            # Only keep waking up while there are still tasks waiting to finish
+            if asyncio.all_tasks(self.event_loop):
+                self.root.after(10, self._pump_event_loop)
+            else:
+                self._event_loop_pumping = False
+    
+    
+    def _maybe_build_calibration_tab(self, event: tk.Event):
+        # Building the calibration tab loads the calibration profile, so put it off until the tab is actually shown
+        if self.tab_calibration is None and self.notebook.select() == str(self._calibration_container):
+            self.tab_calibration = view_calibration(self._calibration_container)
+    
+    
     def update_tab_selectable_state(self):
         # Check to see if a test board is connected
         connected = self.tab_connect.test_board_connected
         
-        # Update notebook tab availability accordingly
-        if connected:
-            for tab_idx in range(1, len(self.notebook.tabs())):
-                self.notebook.tab(tab_idx, state="normal")
-        else:
-            for tab_idx in range(1, len(self.notebook.tabs())):
-                self.notebook.tab(tab_idx, state="disabled")
+        # Nothing to do if the tabs are already in the right state
+        new_tab_state = "normal" if connected else "disabled"
+        if new_tab_state == self._last_tab_state:
+            return
+        self._last_tab_state = new_tab_state
+        
+        # Update notebook tab availability accordingly, with all tabs updated in a single Tcl call
+        tab_state_script = ";".join(f"{self.notebook} tab {tab_idx} -state {new_tab_state}"
+                                    for tab_idx in range(1, len(self.notebook.tabs())))
+        self.notebook.tk.eval(tab_state_script)
     
     
     def shutdown_tasks(self):
-        self.tab_connect.disconnect_from_test_board
+        self.tab_connect.shutdown()
         self.root.destroy()
+        self.event_loop.close()
 
 
 class view():
@@ -64,6 +129,18 @@ class view():
         # Create a frame to place graphical elements within
         self.frm = ttk.Frame(master, padding=10)
         self.frm.grid()
+        
+        # The text most recently set on each widget with set_widget_text()
+        self._widget_texts = {}
+    
+    
+    def set_widget_text(self, widget: ttk.Widget, text: str) -> None:
+        # Reconfiguring a widget makes Tk redo its layout, so skip it if the text hasn't changed
+        if self._widget_texts.get(widget) == text:
+            return
+        
+        self._widget_texts[widget] = text
+        widget.configure(text=text)
 
 
 class view_connect(view):
@@ -77,25 +154,40 @@ class view_connect(view):
         # Show the connection status in a label at the top of this screen (always start disconnected)
         self._connection_status_label = ttk.Label(self.frm)
         self._connection_status_label.grid(column=0, columnspan=3, row=0, pady=(0, 10))
-        self.ser = None
+        
+        # A single serial port object is reused for every connection; it isn't opened until a port is assigned to it
+        # in connect_to_test_board()
+        baudrate, timeout = settings.get_serial_params()
+        self.ser = Serial(baudrate=baudrate, timeout=timeout)
+        
+        # Opening and closing serial ports can block for a while, so this is done on a worker thread to keep the GUI
+        # responsive; only the Serial calls themselves run there, and all Tk calls stay on the main thread
+        self._io_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._io_future = None
+        
+        # Identifies the devices currently shown in the device list, so that it's only rebuilt when they change
+        self._last_device_signature = None
         
         # Show a list of all potentially relevant devices to connect to
         ttk.Label(self.frm, text="Device:", justify="left").grid(column=0, row=1)
         self._device_drop_down_text = tk.StringVar()
-        self._device_drop_down = ttk.Combobox(self.frm, textvariable=self._device_drop_down_text)
+        # Devices can only be picked from the list, so the combobox is read-only
+        self._device_drop_down = ttk.Combobox(self.frm, textvariable=self._device_drop_down_text, state="readonly", values=())
         self._device_drop_down.grid(column=1, row=1, padx=(0, 10))
         # Whenever the user selects a device, populate the corresponding device name
-        self._device_drop_down.bind("<<ComboboxSelected>>", lambda event: self._device_drop_down_text.set(self._device_list_values[self._device_list_display_values.index(self._device_drop_down.get())]))
-        self.update_device_list()
+        self._device_display_to_value = {}
+        self._device_drop_down.bind("<<ComboboxSelected>>", self._on_device_selected)
         # Add refresh button to rescan for devices
-        ttk.Button(self.frm, text="Refresh Device List", command=self.update_device_list).grid(column=2, row=1)
+        ttk.Button(self.frm, text="Refresh Device List", command=self.refresh_device_list).grid(column=2, row=1)
         
         # Add a button to connect/disconnect from the target device
         self._connect_disconnect_button = ttk.Button(self.frm, command=self.connect_disconnect_test_board)
         self._connect_disconnect_button.grid(column=2, row=2, pady=(10, 0))
-        self.update_connect_disconnect_text()
-        # Also trigger this event if the user hits enter on the combobox
-        self._device_drop_down.bind("<Return>", lambda event: self._connect_disconnect_button.invoke())
+        
+        # Populate the device list and status text once the frame has been fully built, rather than laying it out
+        # again part way through; this also lets the window show up before the (slow) device scan finishes
+        self.frm.after_idle(self.update_device_list)
+        self.frm.after_idle(self.update_connect_disconnect_text)
         
     
     @property
@@ -103,30 +195,58 @@ class view_connect(view):
         """Whether or not a BMS test board has been connected to the host PC. True if a BMS test board has been
         connected, otherwise False.
         """
-        return not self.ser is None
+        return self.ser.is_open
 
 
-    def scan_for_devices() -> list[ListPortInfo]:
-        """Lists all Pi Pico devices running MicroPython which are connected to the host PC
+    # The (time.monotonic() timestamp, results) of the most recent device scan, and how long those results are reused
+    # for (s); see scan_for_devices()
+    _device_scan_cache = (None, [])
+    _device_scan_cache_ttl = 0.5
+    
+    
+    @staticmethod
+    def scan_for_devices() -> "list[ListPortInfo]":
+        """Lists all Pi Pico devices running MicroPython which are connected to the host PC. Enumerating serial ports is
+        slow, so back-to-back scans within `_device_scan_cache_ttl` seconds of each other reuse the same results.
 
         Returns:
             list[ListPortInfo]: A list of all Pi Pico USB devices which are running MicroPython and connected to the
             host PC. See https://pyserial.readthedocs.io/en/latest/tools.html#serial.tools.list_ports.ListPortInfo.
         """
         
-        # Relevant devices have a vendor ID of 0x2E8A and a product ID of 0x0005; see this page for details:
-        # https://github.com/raspberrypi/usb-pid
-        return list(filter(lambda port: port.pid == 0x0005 and port.vid == 0x2E8A, comports()))
+        # Reuse the last scan if it's recent enough
+        now = time.monotonic()
+        scan_time, devices = view_connect._device_scan_cache
+        if scan_time is not None and now - scan_time < view_connect._device_scan_cache_ttl:
+            return devices
+        
+        # Relevant devices are listed in _RPI_MICROPYTHON_IDS
+        devices = [port for port in comports() if (port.vid, port.pid) in _RPI_MICROPYTHON_IDS]
+        view_connect._device_scan_cache = (now, devices)
+        return devices
+    
+    
+    def refresh_device_list(self):
+        # Discard the cached device scan so that the device list reflects the devices which are connected right now
+        view_connect._device_scan_cache = (None, [])
+        self.update_device_list()
     
     
     def update_device_list(self):
         # Get all the relevant devices
         devices = view_connect.scan_for_devices()
         
+        # Don't touch the drop-down if the same devices are still connected
+        device_signature = tuple((device.device, device.vid, device.pid, device.serial_number) for device in devices)
+        if device_signature == self._last_device_signature:
+            return
+        self._last_device_signature = device_signature
+        
         # List the values to populate (the COM ports) and the corresponding values to display (the COM ports, plus the
         # corresponding manufacturers, products, and descriptions)
-        self._device_list_values = list(device.device for device in devices)
-        self._device_list_display_values = list(f"{device.device} ({device.manufacturer} {device.product}: {device.description})" for device in devices)
+        self._device_list_values = [device.device for device in devices]
+        self._device_list_display_values = ["".join((device.device, " (", str(device.manufacturer), " ", str(device.product), ": ", str(device.description), ")")) for device in devices]
+        self._device_display_to_value = dict(zip(self._device_list_display_values, self._device_list_values))
         
         # Update the drop-down text to match the new values
         self._device_drop_down.configure(values=self._device_list_display_values)
@@ -136,23 +256,44 @@ class view_connect(view):
             self._device_drop_down_text.set(self._device_list_values[0])
         
 
+    def _on_device_selected(self, event: tk.Event):
+        # Replace the selected display text with the corresponding device name
+        self._device_drop_down_text.set(self._device_display_to_value.get(self._device_drop_down.get(), ""))
+        
+
     def connect_to_test_board(self, device: str):
-        # Check to see if a device was properly specified
+        # Check to see if a device was properly specified (the device list may be empty)
         if device == "":
             messagebox.showerror("Error", "Please select a valid device!", parent=self.frm.master)
             return
         
+        # Open the serial connection to the target device on the worker thread
+        self.ser.port = device
+        self._run_on_io_thread(self._open_serial_port, self._on_connect_finished)
+    
+    
+    def _open_serial_port(self):
+        # Runs on the worker thread, so this must not touch any Tk widgets
+        self.ser.open()
+        
+        # Enlarge the OS serial buffers so that large bursts of data fit in them in one go (this is only supported on
+        # Windows); the port is already open and usable with the default buffers, so a failure here isn't fatal
+        if hasattr(self.ser, "set_buffer_size"):
+            try:
+                self.ser.set_buffer_size(rx_size=_SERIAL_BUFFER_SIZE, tx_size=_SERIAL_BUFFER_SIZE)
+            except (SerialException, OSError, ValueError) as e:
+                logging.info(f"Failed to enlarge the serial buffers at '{self.ser.port}', continuing with the defaults; full traceback:\n{e}")
+    
+    
+    def _on_connect_finished(self, future: concurrent.futures.Future):
         try:
-            # Open a new serial connection to the target device
-            self.ser = Serial(port=device,
-                              baudrate=settings.current_settings[settings._key_serial_baudrate],
-                              timeout=settings.current_settings[settings._key_serial_timeout])
-            logging.info(f"Opened serial port at '{device}'")
+            future.result()
+            logging.info(f"Opened serial port at '{self.ser.port}'")
         
         except SerialException as e:
             # Failed to open the requested serial port, show an error popup to the user and continue
-            messagebox.showerror("Error", f"Failed to open serial port at '{device}'!", parent=self.frm.master)
-            logging.info(f"Failed to open serial port at '{device}'; full traceback:\n{e}")
+            messagebox.showerror("Error", f"Failed to open serial port at '{self.ser.port}'!", parent=self.frm.master)
+            logging.info(f"Failed to open serial port at '{self.ser.port}'; full traceback:\n{e}")
             
         # TODO check to ensure the connected device is really the desired one
         
@@ -162,9 +303,49 @@ class view_connect(view):
             
     
     def disconnect_from_test_board(self):
+        # Nothing to do if no test board is connected
+        if not self.ser.is_open:
+            return
+        
+        # Close the serial port on the worker thread
         logging.info(f"Closing serial port at '{self.ser.port}'")
-        self.ser.close()
-        self.ser = None
+        self._run_on_io_thread(self.ser.close, lambda future: None)
+    
+    
+    def shutdown(self):
+        """Closes the connection to the test board before the application exits, once any connect or disconnect which
+        is still running on the worker thread has finished (so that a port which is still being opened isn't left open).
+        """
+        self._io_executor.shutdown(wait=True)
+        if self.ser.is_open:
+            logging.info(f"Closing serial port at '{self.ser.port}'")
+            self.ser.close()
+    
+    
+    def _run_on_io_thread(self, function: Callable[[], None], callback_finished: Callable[[concurrent.futures.Future], None]):
+        # Run the function on the worker thread, and don't accept another connect/disconnect request until it's finished
+        self._io_future = self._io_executor.submit(function)
+        self._connect_disconnect_button.state(["disabled"])
+        self.frm.after(50, self._poll_io_future, callback_finished)
+    
+    
+    def _poll_io_future(self, callback_finished: Callable[[concurrent.futures.Future], None]):
+        # Keep waiting until the function running on the worker thread has finished
+        if not self._io_future.done():
+            self.frm.after(50, self._poll_io_future, callback_finished)
+            return
+        
+        # Handle the result back on the main thread
+        future = self._io_future
+        self._io_future = None
+        self._connect_disconnect_button.state(["!disabled"])
+        callback_finished(future)
+        
+        # Update status text
+        self.update_connect_disconnect_text()
+        
+        # Update main window tab state
+        self.callback_connect_disconnect()
         
     
     def update_connect_disconnect_text(self):
@@ -172,15 +353,17 @@ class view_connect(view):
         connected = self.test_board_connected
         
         # Update status label
-        self._connection_status_label.configure(text = f"Connected to test board at {self.ser.port}." if connected else "Not connected to test board.")
+        self.set_widget_text(self._connection_status_label, f"Connected to test board at {self.ser.port}." if connected else "Not connected to test board.")
         
         # Update connect/disconnect button text
-        self._connect_disconnect_button.configure(text = "Disconnect" if connected else "Connect")
+        self.set_widget_text(self._connect_disconnect_button, "Disconnect" if connected else "Connect")
     
         
     def connect_disconnect_test_board(self):
         # The connect/disconnect button's function depends on whether a device is already connected; check state
         connected = self.test_board_connected
+        # (the status text and tab state are updated once the serial port has been opened or closed, see
+        # _poll_io_future())
         if connected:
             self.disconnect_from_test_board()
         else:
@@ -188,22 +371,20 @@ class view_connect(view):
             target_device = self._device_drop_down_text.get()
             self.connect_to_test_board(target_device)
         
-        # Update status text
-        self.update_connect_disconnect_text()
-        
-        # Update main window tab state
-        self.callback_connect_disconnect()
-        
 
 class view_calibration(view):
     def __init__(self, master: Misc | None) -> None:
         super().__init__(master)
         
-        # Create a new calibration instance
-        self.calibration = calibration()
+        # Creating a calibration instance loads the calibration profile from the disk, so this is done on a worker thread
+        # (see _poll_calibration_load()); the calibration is None until then
+        self.calibration = None
         
         # Automatic calibration button
         def auto_calibrate():
+            if not self._check_calibration_available():
+                return
+            
             do_calibration = messagebox.askyesno("Auto-Calibrate",
                 "The auto-calibration procedure will generate test voltages for each cell and temperature connection " +
                 "and use the BMS sense board to read the corresponding voltages which are output by the test board. " +
@@ -221,6 +402,9 @@ class view_calibration(view):
         
         # Default calibration button
         def default_calibration():
+            if not self._check_calibration_available():
+                return
+            
             do_calibration = messagebox.askyesno("Reset Calibration",
                                                  "Would you like to restore the test board's calibration settings to " +
                                                  "their default values?",
@@ -233,6 +417,9 @@ class view_calibration(view):
         
         # Save calibration button
         def save_calibration():
+            if not self._check_calibration_available():
+                return
+            
             do_save = messagebox.askyesno("Save Calibration",
                                           "Saving the current calibration will overwrite any previous calibration " +
                                           "data. Would you like to continue?",
@@ -242,11 +429,16 @@ class view_calibration(view):
                 self.update_calibration_status(unsaved_changes=False)
                 settings.save_current_settings()
         
-        self._save_calibration_button = ttk.Button(self.frm, command=save_calibration)
+        self._save_calibration_button = ttk.Button(self.frm, text="Save Calibration", command=save_calibration)
         self._save_calibration_button.grid(column=0, row=2, pady=(0, 10))
         
         # Load calibration button
         def load_calibration():
+            # If the calibration failed to load in the first place, try loading it again from scratch
+            if self.calibration is None:
+                self._start_calibration_load()
+                return
+            
             # Check to see if there is an available calibration file
             time_since_last_calibration = self.calibration.time_since_last_calibration()
             if time_since_last_calibration is None:
@@ -278,7 +470,66 @@ class view_calibration(view):
         # Show the calibration status in a label at the top of the screen
         self._calibration_status_label = ttk.Label(self.frm)
         self._calibration_status_label.grid(column=0, columnspan=2, row=0, pady=(0, 10))
+        
+        # Start loading the calibration
+        self._start_calibration_load()
+    
+    
+    def _start_calibration_load(self):
+        # Disable all of the buttons until the calibration has loaded
+        self.set_widget_text(self._calibration_status_label, "Loading calibration...")
+        self._set_buttons_enabled(False)
+        load_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._calibration_load_future = load_executor.submit(view_calibration._load_calibration)
+        load_executor.shutdown(wait=False)
+        self.frm.after(50, self._poll_calibration_load)
+    
+    
+    @staticmethod
+    def _load_calibration() -> calibration:
+        # Runs on a worker thread, so this must not touch any Tk widgets
+        new_calibration = calibration()
+        new_calibration.time_since_last_calibration()
+        return new_calibration
+    
+    
+    def _poll_calibration_load(self):
+        # Keep waiting until the calibration has been loaded
+        if not self._calibration_load_future.done():
+            self.frm.after(50, self._poll_calibration_load)
+            return
+        
+        # Apply the calibration back on the main thread
+        future = self._calibration_load_future
+        self._calibration_load_future = None
+        self._set_buttons_enabled(True)
+        try:
+            self.calibration = future.result()
+        
+        except Exception as e:
+            # Failed to load the calibration, show an error popup to the user and continue without one; it can be
+            # loaded again with the load calibration button
+            self.set_widget_text(self._calibration_status_label, "Failed to load calibration.")
+            messagebox.showerror("Error", f"Failed to load calibration profile from the disk due to the following error: '{e}'", parent=self.frm.master)
+            logging.info(f"Failed to load calibration profile; full traceback:\n{e}")
+            return
+        
         self.update_calibration_status(unsaved_changes=False)
+    
+    
+    def _check_calibration_available(self) -> bool:
+        # The calibration is None if it failed to load, in which case it must be loaded again before it can be changed
+        if self.calibration is None:
+            messagebox.showerror("Error", "No calibration profile is loaded! Please load one first.", parent=self.frm.master)
+            return False
+        
+        return True
+    
+    
+    def _set_buttons_enabled(self, enabled: bool):
+        for widget in self.frm.winfo_children():
+            if isinstance(widget, ttk.Button):
+                widget.state(["!disabled"] if enabled else ["disabled"])
             
         
     
@@ -300,12 +551,12 @@ class view_calibration(view):
         # Also update based on whether or not there are any unsaved canges
         if unsaved_changes:
             status_text += " There are unsaved changes to the calibration profile."
-            self._save_calibration_button.configure(text="Save Calibration*")
+            self.set_widget_text(self._save_calibration_button, "Save Calibration*")
         else:
-            self._save_calibration_button.configure(text="Save Calibration")
+            self.set_widget_text(self._save_calibration_button, "Save Calibration")
         
         # Update status text
-        self._calibration_status_label.configure(text=status_text)
+        self.set_widget_text(self._calibration_status_label, status_text)
 
 
 if __name__ == '__main__':
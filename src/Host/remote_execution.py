@@ -1,21 +1,170 @@
 from serial import Serial, SerialException
+import time
+import asyncio
+import ast
+import threading
 import settings
 
 
 _seq_cmd_prompt = b'>>> '
+_seq_prompt_len = len(_seq_cmd_prompt)
+_neg_prompt_len = -_seq_prompt_len
+# What the device returns after a ctrl-C or a soft reset
+_seq_cancel_expected = b'\r\n' + _seq_cmd_prompt
+# Paste mode prompts, which are shown when paste mode is entered and after each line
+_seq_paste_prompt = b'=== '
+_seq_paste_newline = b'\r\n' + _seq_paste_prompt
 _board_obj_name = "board"
+# Code which is executed often, already converted to ASCII bytes (see _execute_prebuilt())
+_code_read_ADC_5V = bytes(_board_obj_name + ".read_ADC_5V()", "ASCII")
+_code_read_ADC_24V = bytes(_board_obj_name + ".read_ADC_24V()", "ASCII")
+_code_read_ADC_both = bytes(_board_obj_name + ".read_ADC_both()", "ASCII")
+# The target device's ADC reference voltage (V) and full-scale reading (counts)
+_adc_reference_voltage = 3.0
+_adc_max_counts = 4095
+# The scale from each device's ADC readings (summed over the number of samples it was initialized with) to volts,
+# computed once by init_device()
+_device_adc_scale = {}
+# How long to wait before each transmission attempt (ms), so that retries don't immediately run into whatever caused the
+# previous attempt to fail; attempts past the end of this table use its last value
+_backoff_ms = (0, 5, 20)
+
+
+class _serial_reader(threading.Thread):
+    """Continuously drains a serial device's receive buffer on a background thread, so that data is pulled from the OS
+    as soon as it arrives and as much at a time as possible, rather than only when (and as fast as) it's read. Data is
+    kept until it's read with `read_until`.
+    """
+    
+    def __init__(self, device: Serial) -> None:
+        super().__init__(name=f"serial reader ({device.port})", daemon=True)
+        self.device = device
+        self._read_data = bytearray()
+        self._data_available = threading.Condition()
+        self._stopped = False
+    
+    
+    def run(self) -> None:
+        # Keep reading until the device is closed or disconnected
+        device = self.device
+        while device.is_open:
+            try:
+                read_chunk = device.read(device.in_waiting or 1)
+            except Exception:
+                # Closing the device while a read is in progress can raise just about anything depending on the platform,
+                # and either way there's nothing left to read
+                break
+            
+            if read_chunk:
+                with self._data_available:
+                    self._read_data += read_chunk
+                    self._data_available.notify_all()
+        
+        # Wake up anything waiting for data, since none will arrive now
+        with self._data_available:
+            self._stopped = True
+            self._data_available.notify_all()
+    
+    
+    def read_until(self, expected_sequence: bytes, timeout: float | None) -> bytes:
+        """Reads data until the expected sequence is received or the timeout elapses, like `Serial.read_until`. Any data
+        after the expected sequence is kept for the next read.
+
+        Args:
+            expected_sequence (bytes): The sequence to read until.
+            timeout (float | None): How long to wait for the expected sequence (s). If None, waits forever.
+
+        Returns:
+            bytes: The data read, up to and including the expected sequence if it was received.
+        """
+        
+        deadline = None if timeout is None else time.monotonic() + timeout
+        search_start = 0
+        
+        with self._data_available:
+            while True:
+                # Only search through data which hasn't already been searched (allowing for a partial match at the end)
+                sequence_start = self._read_data.find(expected_sequence, search_start)
+                if sequence_start >= 0:
+                    read_end = sequence_start + len(expected_sequence)
+                    break
+                search_start = max(0, len(self._read_data) - len(expected_sequence) + 1)
+                
+                # Wait for more data; on timeout (or if the reader has stopped), return everything read so far
+                remaining_time = None if deadline is None else deadline - time.monotonic()
+                if self._stopped or (remaining_time is not None and remaining_time <= 0):
+                    read_end = len(self._read_data)
+                    break
+                self._data_available.wait(remaining_time)
+            
+            read_data = bytes(self._read_data[:read_end])
+            del self._read_data[:read_end]
+            return read_data
+    
+    
+    def reset(self) -> None:
+        """Discards all data which has been received but not yet read, so that anything left over from a previous
+        exchange with the device isn't mistaken for a response to the next one.
+        """
+        
+        with self._data_available:
+            self._read_data.clear()
+
+
+# The background reader for each serial device, see _read_until_bulk()
+_serial_readers = {}
+
+
+def _get_reader(device: Serial) -> _serial_reader:
+    # Gets the background reader for the device. The reader is started the first time it's needed for each device, and
+    # restarted if it stopped because the device was closed (and has since been reopened)
+    reader = _serial_readers.get(device)
+    if reader is None or not reader.is_alive():
+        reader = _serial_reader(device)
+        reader.start()
+        _serial_readers[device] = reader
+    
+    return reader
+
+
+def _read_until_bulk(device: Serial, expected_sequence: bytes) -> bytes:
+    # Reads from the device until the expected sequence is received or the device's timeout elapses, like
+    # Serial.read_until(), but with data read in bulk by a background reader
+    return _get_reader(device).read_until(expected_sequence, device.timeout)
+
+
+def _reset_read_data(device: Serial) -> None:
+    # Discards any data received from the device which hasn't been read yet; this is done before each transmission
+    # attempt and each cancel, so that data left over from an earlier failed exchange can't throw off later reads
+    _get_reader(device).reset()
+
+
+def _wait_before_retry(attempt: int) -> None:
+    # Waits before the specified transmission attempt according to _backoff_ms (the first attempt, 0, doesn't wait)
+    if attempt > 0:
+        time.sleep(_backoff_ms[min(attempt, len(_backoff_ms) - 1)] / 1000)
 
 
 def _send_bytes(target_bytes: bytes, device: Serial, expected_sequence: bytes, retry_count: int = 1, expected_sequence_is_complete: bool = True) -> bool:
+    # Note that _read_until_bulk() stops reading as soon as the expected sequence is found, so if it was found at all,
+    # the read data ends with it
+    
+    # Fast path for a single attempt, which is by far the most common case
+    if retry_count == 1:
+        device.write(target_bytes)
+        read_data = _read_until_bulk(device, expected_sequence)
+        return read_data == expected_sequence if expected_sequence_is_complete else read_data.endswith(expected_sequence)
+    
     for transmit_attempts in range(retry_count):
+        _wait_before_retry(transmit_attempts)
         
         # Send target bytes
         device.write(target_bytes)
         
         # Listen for the expected return sequence
-        read_data = device.read_until(expected_sequence)
+        read_data = _read_until_bulk(device, expected_sequence)
         if (read_data == expected_sequence and expected_sequence_is_complete) or \
-            (expected_sequence in read_data and not expected_sequence_is_complete):
+            (read_data.endswith(expected_sequence) and not expected_sequence_is_complete):
             # The correct return sequence was found
             return True
         
@@ -33,6 +182,9 @@ def execute_code(code: str, device: Serial, retry_count: int = None):
         `serial.SerialException` is raised. If None, defaults to the value specified in the settings file. Defaults to
         None.
 
+    The code is sent and its echo checked before the newline which begins its execution is sent, so code which was
+    corrupted in transmission is cancelled before it runs and is never executed twice.
+
     Raises:
         UnicodeDecodeError: if the passed argument `code` is not ASCII-encodable.
         serial.SerialException: if the requested code could not be executed due to failed communication with the target
@@ -42,51 +194,171 @@ def execute_code(code: str, device: Serial, retry_count: int = None):
         str: The data returned from the device after executing the specified `code`.
     """
     
+    # Convert input code to ASCII bytes for serial transmission
+    return _execute_prebuilt(bytes(code, "ASCII", "strict"), device, retry_count)
+
+
+def _execute_prebuilt(code_bytes: bytes, device: Serial, retry_count: int = None, idempotent: bool = False) -> str:
+    # Same as execute_code(), but for code which has already been converted to ASCII bytes, so that code which is executed
+    # often can be converted once up front.
+    # If the code is idempotent (i.e. running it twice has the same effect as running it once, like reading an ADC), the
+    # code and the newline which begins its execution are sent in a single write to save a round trip. The echo is then
+    # only checked after the device has started running the code, so corrupted code may run before being retried; this
+    # is why other code is only executed once its echo has been checked
+    
     # Set retry_count to its default value if not specified
-    retry_count = settings.current_settings[settings._key_serial_retry_count] if retry_count is None else retry_count
+    retry_count = settings.get_serial_retry_count() if retry_count is None else retry_count
     
-    # Convert input code to ASCII bytes for serial transmission
-    code_bytes = bytes(code, "ASCII", "strict")
+    # The device echoes the code back, followed by a newline once execution begins
+    payload = code_bytes + b'\r' if idempotent else code_bytes
+    expected_echo = code_bytes + b'\r\n' if idempotent else code_bytes
 
     for code_transmit_attempt in range(retry_count):
+        _wait_before_retry(code_transmit_attempt)
+        _reset_read_data(device)
         
-        # Attempt to transmit the code bytes to the target device
-        transmit_success = _send_bytes(code_bytes, device, code_bytes)
-        # If the code bytes were successfully transmitted to the target device, continue to execution
-        if transmit_success:
-            break
+        # Attempt to transmit the code bytes to the target device. The echo is read up to its end before looking for the
+        # command prompt, so that code which itself contains a command prompt sequence isn't mistaken for the end of the
+        # returned data
+        device.write(payload)
+        echo = _read_until_bulk(device, expected_echo[-2:] if idempotent else expected_echo)
+        if echo == expected_echo:
+            # If the code bytes were successfully transmitted to the target device, transmit a newline character to
+            # begin execution if that wasn't already sent (this isn't retried, since the code may already be running)
+            if not idempotent and not _send_bytes(b'\r', device, b'\r\n'):
+                raise SerialException(f"Failed to begin execution of the following line of code: '{code_bytes.decode("ASCII")}'")
+            
+            # Read the returned data
+            return _read_returned_data(device, code_bytes)
         
         # Code was not transmitted successfully, attempt to cancel its execution with ctrl-C (ASCII code 0x03)
-        cancel_success = _send_bytes(b'\x03', device, b'\r\n' + _seq_cmd_prompt, retry_count)
+        # This is only attempted once, since the surrounding loop already retries
+        # Anything printed by partially-executed code (e.g. a KeyboardInterrupt traceback) may come before the prompt
+        _reset_read_data(device)
+        cancel_success = _send_bytes(b'\x03', device, _seq_cancel_expected, expected_sequence_is_complete=False)
         if not cancel_success:
-            raise SerialException(f"Failed to cancel the execution of the following line of code after it was incorrectly transmitted to the target device: '{code}'")
+            raise SerialException(f"Failed to cancel the execution of the following line of code after it was incorrectly transmitted to the target device: '{code_bytes.decode("ASCII")}'")
             
         # Code could not be transmitted successfully, but its execution was cancelled. If all attempts to transmit the
         # target code have been exhausted, error out,
         if code_transmit_attempt == (retry_count - 1):
-            raise SerialException(f"Failed to execute the following line of code because it could not be correctly transmitted to the target device: '{code}'")
+            raise SerialException(f"Failed to execute the following line of code because it could not be correctly transmitted to the target device: '{code_bytes.decode("ASCII")}'")
+
+
+async def execute_code_async(code: str, device: Serial, retry_count: int = None) -> str:
+    """Same as `execute_code`, but runs on a worker thread so that other coroutines (e.g. for other devices) can run while
+    waiting on the target device. Only one call should be in progress for each device at a time.
+
+    Args:
+        code (str): The code to execute. This code must be ASCII-encodable.
+        device (Serial): The target device on which to execute MicroPython code.
+        retry_count (int): See `execute_code`. Defaults to None.
+
+    Returns:
+        str: The data returned from the device after executing the specified `code`.
+    """
+    
+    return await asyncio.to_thread(execute_code, code, device, retry_count)
+
+
+def execute_code_batch(lines: list[str], device: Serial, retry_count: int = None) -> str:
+    """Executes several lines of code in one go using the MicroPython REPL's paste mode, which takes a single round
+    trip instead of one per line. Unlike `execute_code`, the values of expressions are not returned, so use print() to
+    return data from the device.
+
+    Args:
+        lines (list[str]): The lines of code to execute, in order. This code must be ASCII-encodable.
+        device (Serial): The target device on which to execute MicroPython code.
+        retry_count (int): The maximum number of times to attempt to execute the specified `lines` before a
+        `serial.SerialException` is raised. If None, defaults to the value specified in the settings file. Defaults to
+        None.
+
+    Raises:
+        UnicodeDecodeError: if any of the passed `lines` are not ASCII-encodable.
+        serial.SerialException: if the requested code could not be executed due to failed communication with the target
+        serial device.
+
+    Returns:
+        str: The data returned from the device after executing the specified `lines`.
+    """
+    
+    # Set retry_count to its default value if not specified
+    retry_count = settings.get_serial_retry_count() if retry_count is None else retry_count
+    
+    # Convert input code to ASCII bytes for serial transmission; in paste mode, the device echoes back each line followed
+    # by a new paste mode prompt
+    lines_bytes = [bytes(line, "ASCII", "strict") for line in lines]
+    payload = b''.join(line_bytes + b'\r' for line_bytes in lines_bytes)
+    expected_echo = b''.join(line_bytes + _seq_paste_newline for line_bytes in lines_bytes)
+    code_bytes = b"; ".join(lines_bytes)
+    
+    for code_transmit_attempt in range(retry_count):
+        _wait_before_retry(code_transmit_attempt)
+        _reset_read_data(device)
+        
+        # Enter paste mode with ctrl-E (ASCII code 0x05), then attempt to transmit the code bytes to the target device
+        if _send_bytes(b'\x05', device, _seq_paste_prompt, expected_sequence_is_complete=False):
+            device.write(payload)
+            echo = _read_until_bulk(device, expected_echo)
+            # If the code bytes were successfully transmitted to the target device, continue to execution
+            if echo == expected_echo:
+                break
         
-    # Once the code has been successfully transmitted, transmit a newline character to begin execution
-    execute_success = _send_bytes(b'\r', device, b'\r\n', retry_count)
+        # Code was not transmitted successfully, attempt to leave paste mode without executing it with ctrl-C (ASCII
+        # code 0x03)
+        # This is only attempted once, since the surrounding loop already retries
+        # Anything printed by partially-executed code (e.g. a KeyboardInterrupt traceback) may come before the prompt
+        _reset_read_data(device)
+        cancel_success = _send_bytes(b'\x03', device, _seq_cancel_expected, expected_sequence_is_complete=False)
+        if not cancel_success:
+            raise SerialException(f"Failed to cancel the execution of the following code after it was incorrectly transmitted to the target device: '{code_bytes.decode("ASCII")}'")
+        
+        # Code could not be transmitted successfully, but its execution was cancelled. If all attempts to transmit the
+        # target code have been exhausted, error out,
+        if code_transmit_attempt == (retry_count - 1):
+            raise SerialException(f"Failed to execute the following code because it could not be correctly transmitted to the target device: '{code_bytes.decode("ASCII")}'")
+    
+    # Once the code has been successfully transmitted, transmit ctrl-D (ASCII code 0x04) to leave paste mode and begin
+    # execution
+    execute_success = _send_bytes(b'\x04', device, b'\r\n')
     if not execute_success:
-        raise SerialException(f"Failed to begin execution of the following line of code: '{code}'")
+        raise SerialException(f"Failed to begin execution of the following code: '{code_bytes.decode("ASCII")}'")
     
     # Get the returned data from the target device
-    read_data = device.read_until(_seq_cmd_prompt)
+    return _read_returned_data(device, code_bytes)
+
+
+def _read_returned_data(device: Serial, code_bytes: bytes) -> str:
+    # Reads the data returned from the device after executing `code_bytes`, up to the next command prompt. The prompt
+    # is always at the start of a line, so if a command prompt sequence is found partway through a line, it's part of
+    # the returned data and reading continues
+    read_data = _read_until_bulk(device, _seq_cmd_prompt)
+    while read_data.endswith(_seq_cmd_prompt) and read_data != _seq_cmd_prompt and \
+        not read_data.endswith(_seq_cancel_expected):
+        more_data = _read_until_bulk(device, _seq_cmd_prompt)
+        if not more_data:
+            break
+        read_data += more_data
+    
+    return _strip_returned_data(read_data, code_bytes)
+
+
+def _strip_returned_data(read_data: bytes, code_bytes: bytes) -> str:
+    # Convert the returned data to a string once, and work with that from here on
+    returned_data = read_data.decode("ASCII")
     
     # Make sure the returned data actually ends with a new commad prompt sequence
-    if not read_data[(-1 * len(_seq_cmd_prompt)):] == _seq_cmd_prompt:
-        raise SerialException(f"Failed to read all returned data after execution of the following line of code: '{code}'. This could be due to a timeout error or a transmission error. The following data was returned: '{read_data.decode("ASCII")}'")
+    if not read_data.endswith(_seq_cmd_prompt):
+        raise SerialException(f"Failed to read all returned data after execution of the following line of code: '{code_bytes.decode("ASCII")}'. This could be due to a timeout error or a transmission error. The following data was returned: '{returned_data}'")
     
     # Strip the command prompt sequence from the returned data
-    read_data = read_data[:(-1 * len(_seq_cmd_prompt))]
+    returned_data = returned_data[:_neg_prompt_len]
     
-    # And \n\r if the returned data is non-Null
-    if read_data[-2:] == b'\r\n':
-        read_data = read_data[:-2]
+    # And \n\r if the returned data is non-Null, then return it to the caller
+    if returned_data.endswith("\r\n"):
+        returned_data = returned_data[:-2]
     
-    # Convert the returned data to a string and return it to the caller
-    return read_data.decode("ASCII")
+    return returned_data
 
 
 def execute_function(function_name: str, device: Serial, *args, **kwargs) -> str:
@@ -101,28 +373,37 @@ def execute_function(function_name: str, device: Serial, *args, **kwargs) -> str
     """
     
     # Using the given function name and arguments, construct a line of code to execute remotely
-    args_str = ', '.join(str(arg) for arg in args)
-    kwargs_str = ', '.join(f'{key} = {value}' for key, value in kwargs.items())
-    code_to_execute = f"{function_name}({', '.join((args_str, kwargs_str)) if args_str != "" and kwargs_str != "" else args_str + kwargs_str})"
+    code_to_execute = _function_call_code(function_name, *args, **kwargs)
     
     # Execute the relevant code and return the result
     return execute_code(code_to_execute, device)
 
 
+def _function_call_code(function_name: str, *args, **kwargs) -> str:
+    # Constructs a line of code which calls the specified function with the given arguments
+    args_str = ', '.join(str(arg) for arg in args)
+    kwargs_str = ', '.join(f'{key} = {value}' for key, value in kwargs.items())
+    return f"{function_name}({', '.join(filter(None, (args_str, kwargs_str)))})"
+
+
 def reset_device(device: Serial, retry_count: int = None) -> None:
     # Set retry_count to its default value if not specified
-    retry_count = settings.current_settings[settings._key_serial_retry_count] if retry_count is None else retry_count
+    retry_count = settings.get_serial_retry_count() if retry_count is None else retry_count
         
     # Send ctrl-C (ASCII code 0x03) to exit from any line of code which has been typed or any code which is currently
-    # executing
-    cancel_success = _send_bytes(b'\x03', device, b'\r\n' + _seq_cmd_prompt, retry_count)
+    # executing, discarding anything read from the device beforehand
+    _reset_read_data(device)
+    cancel_success = _send_bytes(b'\x03', device, _seq_cancel_expected, retry_count)
     if not cancel_success:
         raise SerialException("Failed to reset device because queued or running code could not be cancelled.")
     
     # Send ctrl-D (ASCII code 0x04) to reset the target device
-    reset_success = _send_bytes(b'\x04', device, b'\r\n' + _seq_cmd_prompt, retry_count, expected_sequence_is_complete=False)
+    reset_success = _send_bytes(b'\x04', device, _seq_cancel_expected, retry_count, expected_sequence_is_complete=False)
     if not reset_success:
         raise SerialException("Failed to reset device because it did not resmpond to a soft reset request.")
+    
+    # The soft reset clears the board object, so the device has to be initialized again before its ADCs are read
+    _device_adc_scale.pop(device, None)
 
 
 def init_device(device: Serial,
@@ -146,17 +427,37 @@ def init_device(device: Serial,
     local_adc_read_frequency = settings.current_settings[settings._key_local_adc_read_frequency] if local_adc_read_frequency is None else local_adc_read_frequency
     i2c_frequency = settings.current_settings[settings._key_i2c_bus_frequency] if i2c_frequency is None else i2c_frequency
     
-    # Initialize the device
+    # Forget how the device was previously initialized, in case initializing it again fails partway through
+    _device_adc_scale.pop(device, None)
+    
+    # Initialize the device; the import and the constructor call are sent together in a single batch, which prints
+    # nothing unless it raised an exception
     function_name = _board_obj_name + " = main"
-    execute_function(function_name,
-                     device,
-                     local_adc_read_samples = local_adc_read_samples, 
-                     local_adc_read_frequency = local_adc_read_frequency,
-                     i2c_frequency = i2c_frequency)
+    returned_data = execute_code_batch(["from main import main",
+                                        _function_call_code(function_name,
+                                                            local_adc_read_samples = local_adc_read_samples,
+                                                            local_adc_read_frequency = local_adc_read_frequency,
+                                                            i2c_frequency = i2c_frequency)],
+                                       device)
+    if returned_data:
+        raise SerialException(f"Failed to initialize the target device, which returned the following: '{returned_data}'")
+    
+    # Once the device is initialized, compute the scale from its ADC readings to volts; each reading is the sum of the
+    # raw 12-bit ADC counts of all samples taken
+    _device_adc_scale[device] = _adc_reference_voltage / (local_adc_read_samples * _adc_max_counts)
+    
     
+def _get_adc_scale(device: Serial) -> float:
+    # Gets the scale from the target device's ADC readings to volts
+    adc_scale = _device_adc_scale.get(device)
+    if adc_scale is None:
+        raise ValueError("The target device's ADCs can't be read before it is initialized with init_device().")
     
+    return adc_scale
+
+
 def read_ADC_5V(device: Serial) -> float:
-    """Reads the SENSE_5V ADC line on the target device.
+    """Reads the SENSE_5V ADC line on the target device, which must have been initialized with `init_device`.
 
     Args:
         device (Serial): The target device.
@@ -165,24 +466,40 @@ def read_ADC_5V(device: Serial) -> float:
         float: The nominal voltage at the SENSE_5V ADC input
     """
     
-    function_name = _board_obj_name + ".read_ADC_5V"
-    reading = execute_function(function_name, device)
-    return float(reading)
+    adc_scale = _get_adc_scale(device)
+    reading = _execute_prebuilt(_code_read_ADC_5V, device, idempotent=True)
+    return int(reading) * adc_scale
 
 
 def read_ADC_24V(device: Serial) -> float:
-    """Reads the SENSE_24V ADC line on the target device.
+    """Reads the SENSE_24V ADC line on the target device, which must have been initialized with `init_device`.
 
     Args:
         device (Serial): The target device.
 
     Returns:
-        float: The nominal voltage at the SENSE_5V ADC input
+        float: The nominal voltage at the SENSE_24V ADC input
     """
     
-    function_name = _board_obj_name + ".read_ADC_24V"
-    reading = execute_function(function_name, device)
-    return float(reading)
+    adc_scale = _get_adc_scale(device)
+    reading = _execute_prebuilt(_code_read_ADC_24V, device, idempotent=True)
+    return int(reading) * adc_scale
+
+
+def read_ADC_both(device: Serial) -> tuple[float, float]:
+    """Reads the SENSE_5V and SENSE_24V ADC lines on the target device together, which is quicker than reading them one
+    at a time with `read_ADC_5V` and `read_ADC_24V`. The device must have been initialized with `init_device`.
+
+    Args:
+        device (Serial): The target device.
+
+    Returns:
+        tuple[float, float]: The nominal voltages at the SENSE_5V and SENSE_24V ADC inputs, in that order.
+    """
+    
+    adc_scale = _get_adc_scale(device)
+    reading_5V, reading_24V = ast.literal_eval(_execute_prebuilt(_code_read_ADC_both, device, idempotent=True))
+    return (int(reading_5V) * adc_scale, int(reading_24V) * adc_scale)
 
 
 def set_status_LED(device: Serial, blink_LED: bool = False, blink_rate: int = None) -> None:
@@ -207,13 +524,11 @@ if __name__ == "__main__":
     from calibration import calibration
 
     settings.load_saved_settings()
-    ser = Serial(port="COM4",
-                 baudrate=settings.current_settings[settings._key_serial_baudrate],
-                 timeout=settings.current_settings[settings._key_serial_timeout])
+    baudrate, timeout = settings.get_serial_params()
+    ser = Serial(port="COM4", baudrate=baudrate, timeout=timeout)
     
     # Reset the device
-    execute_code("x = 3", ser)
-    print(execute_code("x", ser))
+    print(execute_code_batch(["x = 3", "print(x)"], ser))
     reset_device(ser)
     # This line should give a NameError, as the target device will have been reset and x will no longer be defined
     print(execute_code("x", ser))
@@ -228,7 +543,8 @@ if __name__ == "__main__":
     set_status_LED(ser, True)
     start_time = time.time()
     for i in range(20):
-        print("5V rail reading:", test_cal.get_voltage_5V(read_ADC_5V(ser)), "[V]")
-        print("24V rail reading:", test_cal.get_voltage_24V(read_ADC_24V(ser)), "[V]")
+        reading_5V, reading_24V = read_ADC_both(ser)
+        print("5V rail reading:", test_cal.get_voltage_5V(reading_5V), "[V]")
+        print("24V rail reading:", test_cal.get_voltage_24V(reading_24V), "[V]")
     print(f"Time to read rails: {time.time() - start_time}")
     set_status_LED(ser, False)
\ No newline at end of file
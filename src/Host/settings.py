@@ -15,13 +15,19 @@ _key_i2c_bus_frequency = "I2C bus clock frequency (Hz)"
 _key_last_calibrated = "last calibrated (UTC)"
 _key_cal_5V = "5V rail monitor calibration"
 _key_cal_24V = "24V rail monitor calibration"
-_key_cal_temp = "temperature calibration"
-_key_cal_cell = "cell voltage calibration"
+_key_cal_temp_m = "temperature calibration slope"
+_key_cal_temp_b = "temperature calibration offset"
+_key_cal_cell_m = "cell voltage calibration slope"
+_key_cal_cell_b = "cell voltage calibration offset"
+# Keys which older settings files used for the temperature and cell calibrations, with each output's slope and offset
+# stored together as [m, b] pairs; see _migrate_settings()
+_key_cal_temp_legacy = "temperature calibration"
+_key_cal_cell_legacy = "cell voltage calibration"
 
 _default_settings = {
     _key_cells_series: 18,
     _key_cells_parallel: 4,
-    _key_serial_baudrate: 115200,
+    _key_serial_baudrate: 921600,
     _key_serial_timeout: 1.0,
     _key_serial_retry_count: 3,
     _key_status_LED_blink_rate: 5,
@@ -31,8 +37,10 @@ _default_settings = {
     _key_last_calibrated : None,
     _key_cal_5V: None,
     _key_cal_24V: None,
-    _key_cal_temp: None,
-    _key_cal_cell: None,
+    _key_cal_temp_m: None,
+    _key_cal_temp_b: None,
+    _key_cal_cell_m: None,
+    _key_cal_cell_b: None,
 }
 
 # Write to this dict using the above keys elsewhere in code to update settings
@@ -44,6 +52,26 @@ def save_current_settings():
         json.dump(current_settings, f, indent=4)
 
 
+def _migrate_settings(loaded_settings: dict) -> None:
+    # Split calibrations saved under the legacy combined keys into separate slope and offset settings, unless those are
+    # already present; the legacy keys are dropped either way, so they aren't saved again
+    legacy_cal_temp = loaded_settings.pop(_key_cal_temp_legacy, None)
+    if legacy_cal_temp is not None and _key_cal_temp_m not in loaded_settings and _key_cal_temp_b not in loaded_settings:
+        try:
+            loaded_settings[_key_cal_temp_m] = [cal[0] for cal in legacy_cal_temp]
+            loaded_settings[_key_cal_temp_b] = [cal[1] for cal in legacy_cal_temp]
+        except (TypeError, IndexError, KeyError):
+            logging.info(f"Could not migrate the legacy '{_key_cal_temp_legacy}' setting, since it is not a list of [slope, offset] pairs.")
+    
+    legacy_cal_cell = loaded_settings.pop(_key_cal_cell_legacy, None)
+    if legacy_cal_cell is not None and _key_cal_cell_m not in loaded_settings and _key_cal_cell_b not in loaded_settings:
+        try:
+            loaded_settings[_key_cal_cell_m] = [[cal[0] for cal in row] for row in legacy_cal_cell]
+            loaded_settings[_key_cal_cell_b] = [[cal[1] for cal in row] for row in legacy_cal_cell]
+        except (TypeError, IndexError, KeyError):
+            logging.info(f"Could not migrate the legacy '{_key_cal_cell_legacy}' setting, since it is not a nested list of [slope, offset] pairs.")
+
+
 def load_saved_settings():
     # Create a sew set of global settings which uses the defaults for any settings not specified in the JSON
     new_current_settings = _default_settings.copy()
@@ -58,9 +86,9 @@ def load_saved_settings():
                 logging.info(f"Attempted to load settings.json, but got object of type {type(loaded_settings)} instead of dict.")
                 
             else:
-                # Apply any specified settings
-                for loaded_setting_key in loaded_settings.keys():
-                    new_current_settings[loaded_setting_key] = loaded_settings[loaded_setting_key]
+                # Apply any specified settings, reading calibrations from older settings files as well
+                _migrate_settings(loaded_settings)
+                new_current_settings = {**_default_settings, **loaded_settings}
     
     except IOError:
         logging.info("Attempted to load settings.json, but an IOError was raised. Reverting to default settings.")
@@ -75,4 +103,24 @@ def load_saved_settings():
 
 def load_default_settings():
     global current_settings
-    current_settings = _default_settings.copy()
\ No newline at end of file
+    current_settings = _default_settings.copy()
+
+
+def get_serial_params() -> tuple[int, float]:
+    """Gets the serial port parameters from the current settings.
+
+    Returns:
+        tuple[int, float]: The serial baudrate and timeout (s), in that order.
+    """
+    
+    return (current_settings[_key_serial_baudrate], current_settings[_key_serial_timeout])
+
+
+def get_serial_retry_count() -> int:
+    """Gets the serial transmission retry count from the current settings.
+
+    Returns:
+        int: The maximum number of times to attempt each serial transmission.
+    """
+    
+    return current_settings[_key_serial_retry_count]
@@ -2,11 +2,11 @@
 from machine import I2C
 
 
-def _changebit(bitmap: bytes, bit: int, value: int):
+def _changebit(bitmap: int, bit: int, value: int):
     if value == 0:
-        return int(bitmap[0] & ~(1 << bit)).to_bytes(1, "big")
+        return bitmap & ~(1 << bit) & 0xFF
     elif value == 1:
-        return (int(bitmap[0]) | (1 << bit)).to_bytes(1, "big")
+        return bitmap | (1 << bit)
     else:
         raise ValueError("Illegal value " + str(value))
 
@@ -15,6 +15,11 @@ class PCA9539:
     def __init__(self, i2c: I2C, address: int = 0x74):
         self.i2c = i2c
         self.address = address
+        
+        # Nothing else writes to the output and configuration ports, so they are read once here (as register pairs,
+        # bank 0 then bank 1) and shadowed in RAM from then on
+        self._shadow_output_ports = bytearray(self.i2c.readfrom_mem(self.address, 0x02, 2))
+        self._shadow_configuration_ports = bytearray(self.i2c.readfrom_mem(self.address, 0x06, 2))
     
     
     def set_pin(self, pin: int, value: int):
@@ -29,13 +34,17 @@ class PCA9539:
         # Get the current output and configuration port states for the given bank
         output_port_address = 0x03 if bank_offset else 0x02
         configuration_port_address = 0x07 if bank_offset else 0x06
-        current_output_port = self.i2c.readfrom_mem(self.address, output_port_address, 1)
-        current_configuration_port = self.i2c.readfrom_mem(self.address, configuration_port_address, 1)
+        current_output_port = self._shadow_output_ports[bank_offset]
+        current_configuration_port = self._shadow_configuration_ports[bank_offset]
         
-        # Set the output to high if value is 1, or low if it is 0
+        # Set the output to high if value is 1, or low if it is 0 (skipping the write if it's already set)
         new_output_port = _changebit(current_output_port, pin_offset, int(value))
-        self.i2c.writeto_mem(self.address, output_port_address, new_output_port)
+        if new_output_port != current_output_port:
+            self.i2c.writeto_mem(self.address, output_port_address, bytes((new_output_port,)))
+            self._shadow_output_ports[bank_offset] = new_output_port
         
-        # Set the specified pin to be an output pin
+        # Set the specified pin to be an output pin (skipping the write if it already is one)
         new_configuration_port = _changebit(current_configuration_port, pin_offset, 0)
-        self.i2c.writeto_mem(self.address, configuration_port_address, new_configuration_port)
\ No newline at end of file
+        if new_configuration_port != current_configuration_port:
+            self.i2c.writeto_mem(self.address, configuration_port_address, bytes((new_configuration_port,)))
+            self._shadow_configuration_ports[bank_offset] = new_configuration_port
@@ -1,81 +1,314 @@
-from machine import ADC, Pin, Timer, I2C
+from machine import ADC, Pin, Timer, I2C, idle, mem32
+import micropython
+from micropython import const
+from array import array
+from time import sleep_us
 import i2c_devices
 
+# Reserve memory for reporting exceptions raised in hard interrupt handlers, where the heap can't be used
+micropython.alloc_emergency_exception_buf(256)
+
+# DMA is only available on newer MicroPython firmware; without it, ADC samples are taken one at a time instead
+try:
+    from rp2 import DMA
+except ImportError:
+    DMA = None
+
+# The status LED is blinked by a PIO state machine where available, so that no timer interrupts are needed
+try:
+    from rp2 import PIO, StateMachine, asm_pio
+except ImportError:
+    StateMachine = None
+
+# ADC registers, used to stream samples into memory with DMA; see section 4.9.6 of the RP2040 datasheet
+_ADC_BASE = const(0x4004C000)
+_ADC_CS = const(_ADC_BASE + 0x00)
+_ADC_RESULT = const(_ADC_BASE + 0x04)
+_ADC_FCS = const(_ADC_BASE + 0x08)
+_ADC_FIFO = const(_ADC_BASE + 0x0C)
+_ADC_DIV = const(_ADC_BASE + 0x10)
+_ADC_CS_EN = const(1 << 0)
+_ADC_CS_START_ONCE = const(1 << 2)
+_ADC_CS_START_MANY = const(1 << 3)
+_ADC_CS_READY = const(1 << 8)
+_ADC_CS_AINSEL_SHIFT = const(12)
+_ADC_CS_RROBIN_SHIFT = const(16)
+_ADC_FCS_EN = const(1 << 0)
+_ADC_FCS_DREQ_EN = const(1 << 3)
+_ADC_FCS_EMPTY = const(1 << 8)
+_ADC_FCS_UNDER = const(1 << 10)
+_ADC_FCS_OVER = const(1 << 11)
+_ADC_FCS_THRESH_SHIFT = const(24)
+_ADC_DIV_INT_SHIFT = const(8)
+_ADC_DIV_INT_MAX = const(0xFFFF)
+_ADC_CLOCK_FREQUENCY = const(48000000)
+_DREQ_ADC = const(36)
+# DMA channel control register (as a word index into DMA.registers), and its busy flag
+_DMA_CTRL_TRIG = const(0x0C // 4)
+_DMA_CTRL_TRIG_BUSY = const(1 << 24)
+
+# Status LED state machine clock frequency; each iteration of its delay loops takes 32 cycles
+_LED_PIO_FREQUENCY = const(100000)
+
+if StateMachine is not None:
+    @asm_pio(set_init=PIO.OUT_HIGH)
+    def _blink_program():
+        # Toggle the output pin forever, waiting for the number of delay loop iterations pushed to the state machine
+        # (plus one) in between each toggle
+        pull()
+        wrap_target()
+        set(pins, 0)
+        mov(x, osr)
+        label("off")
+        jmp(x_dec, "off") [31]
+        set(pins, 1)
+        mov(x, osr)
+        label("on")
+        jmp(x_dec, "on") [31]
+        wrap()
+
+@micropython.viper
+def _sum_adc(cs: int, n: int, sample_period_us: int) -> int:
+    # Take n single ADC conversions using the specified ADC control and status register value (which selects the ADC
+    # channel to sample), waiting sample_period_us between them, and return the sum of their raw 12-bit counts. The
+    # loop is compiled to machine code with viper, so only the wait itself goes through the VM
+    adc_cs = ptr32(_ADC_CS)
+    adc_result = ptr32(_ADC_RESULT)
+    adc_counts = 0
+    i = 0
+    while i < n:
+        adc_cs[0] = cs | _ADC_CS_START_ONCE
+        while not (adc_cs[0] & _ADC_CS_READY):
+            pass
+        adc_counts += adc_result[0]
+        sleep_us(sample_period_us)
+        i += 1
+    return adc_counts
+
+
+@micropython.viper
+def _sum_adc_both(cs_a: int, cs_b: int, n: int, sample_period_us: int, adc_counts: ptr32):
+    # As with _sum_adc(), but alternate between two ADC control and status register values, taking n samples with each
+    # and storing the sums of their raw 12-bit counts in adc_counts[0] and adc_counts[1] respectively
+    adc_cs = ptr32(_ADC_CS)
+    adc_result = ptr32(_ADC_RESULT)
+    adc_counts_a = 0
+    adc_counts_b = 0
+    i = 0
+    while i < n:
+        adc_cs[0] = cs_a | _ADC_CS_START_ONCE
+        while not (adc_cs[0] & _ADC_CS_READY):
+            pass
+        adc_counts_a += adc_result[0]
+        adc_cs[0] = cs_b | _ADC_CS_START_ONCE
+        while not (adc_cs[0] & _ADC_CS_READY):
+            pass
+        adc_counts_b += adc_result[0]
+        sleep_us(sample_period_us)
+        i += 1
+    adc_counts[0] = adc_counts_a
+    adc_counts[1] = adc_counts_b
+
+
+@micropython.viper
+def _sum_even_samples(buffer: ptr16, n: int) -> int:
+    # Return the sum of the even-indexed samples in the first n samples of the buffer
+    adc_counts = 0
+    i = 0
+    while i < n:
+        adc_counts += buffer[i]
+        i += 2
+    return adc_counts
+
+
+def _adc_div(sample_frequency: int):
+    # Get the ADC clock divider register value for the specified sample rate (one sample every DIV + 1 ADC clock
+    # cycles), or None if the sample rate is too low to reach with the divider's 16-bit integer part
+    div_int = (_ADC_CLOCK_FREQUENCY // sample_frequency) - 1
+    if div_int > _ADC_DIV_INT_MAX:
+        return None
+    
+    return div_int << _ADC_DIV_INT_SHIFT
+
+
 class main:
-    def __init__(self, local_adc_read_samples: int, local_adc_read_frequency: int, i2c_frequency: int):
+    def __init__(self, local_adc_read_samples: int, local_adc_read_frequency: int, i2c_frequency: int = None):
         # Pin definitions
         self.pin_sense_24V = Pin(27)
-        self.adc_sense_24V = ADC(self.pin_sense_24V)
+        self.adc_channel_sense_24V = 1
         self.pin_sense_5V = Pin(26)
-        self.adc_sense_5V = ADC(self.pin_sense_5V)
+        self.adc_channel_sense_5V = 0
+        
+        # The RP2040 has a single ADC which is switched between channels for each read, so only one ADC object is kept;
+        # creating ADC objects for both pins sets them up as analog inputs and enables the ADC
+        ADC(self.pin_sense_24V)
+        self.adc = ADC(self.pin_sense_5V)
         
         self.pin_led = Pin(25, Pin.OUT)
         
-        self.pin_scl = Pin(21, Pin.OUT)
-        self.pin_sda = Pin(20, Pin.OUT)
-        self.i2c = I2C(0, scl = self.pin_scl, sda = self.pin_sda, freq = i2c_frequency)
+        # The I2C bus is only set up if a bus frequency is specified, so the ADCs and LED can be used on their own
+        if i2c_frequency is not None:
+            self.pin_scl = Pin(21, Pin.OUT)
+            self.pin_sda = Pin(20, Pin.OUT)
+            self.i2c = I2C(0, scl = self.pin_scl, sda = self.pin_sda, freq = i2c_frequency)
         
         # ADC read information
         self.local_adc_read_samples = local_adc_read_samples
         self.local_adc_read_frequency = local_adc_read_frequency
         
-        # Activity LED timer
-        self.status_LED_timer = None
+        # If DMA is available, samples are streamed directly from the ADC into a buffer without any CPU involvement. The
+        # buffers are allocated once here, and summed once all samples have been taken (a zeroed array can be allocated
+        # directly from a bytearray in MicroPython, without building a list first)
+        if DMA is not None:
+            self._adc_dma = DMA()
+            # DMA control register value: copy 16-bit samples from the ADC FIFO into successive buffer elements, each
+            # time the ADC requests it
+            self._adc_dma_ctrl = self._adc_dma.pack_ctrl(size=1, inc_read=False, treq_sel=_DREQ_ADC)
+            # The channel's registers, so that its busy flag can be checked directly while waiting for a transfer
+            self._adc_dma_registers = self._adc_dma.registers
+            self._adc_buffer = array('H', bytearray(2 * local_adc_read_samples))
+            # Buffer for reading the 5V and 24V sense lines together, with their samples interleaved
+            self._adc_buffer_both = array('H', bytearray(4 * local_adc_read_samples))
+        else:
+            self._adc_dma = None
+        
+        # ADC clock divider register values for reading one sense line and both sense lines with DMA (which samples both
+        # at twice the rate); sample rates too low for the divider are read without DMA instead
+        self._adc_dma_div = None if DMA is None else _adc_div(local_adc_read_frequency)
+        self._adc_dma_div_both = None if DMA is None else _adc_div(2 * local_adc_read_frequency)
+        
+        # Sums of the 5V and 24V sense line samples, for reading both without DMA
+        self._adc_counts_both = array('i', bytearray(8))
+        
+        # Activity LED state machine, or timer if PIO is unavailable (either is allocated once here, rather than each
+        # time the LED starts blinking)
+        if StateMachine is not None:
+            self.status_LED_state_machine = StateMachine(0)
+            self.status_LED_timer = None
+        else:
+            self.status_LED_state_machine = None
+            self.status_LED_timer = Timer(-1)
+        self._status_LED_blinking = False
+        self._status_LED_timer_callback = self._toggle_status_LED
         self.set_status_LED(False)
 
 
-    def _read_ADC(self, adc: ADC):
-        # Take self.adc_read_samples samples from the specified adc port and return the scaled mean (0-1 float)
-        adc_counts = 0
-        samples_remaining = self.local_adc_read_samples
+    def _read_ADC(self, channel: int):
+        # Take self.adc_read_samples samples from the specified ADC channel and return their sum as raw 12-bit ADC
+        # counts (these are converted to volts by the host)
+        if self._adc_dma_div is not None:
+            return self._read_ADC_DMA(channel)
         
-        # Timer callback to take individual ADC samples. Once all samples have been taken, the timer object will be
-        # deinitialized
-        def timer_callback(timer):
-            nonlocal adc_counts, samples_remaining
-            
-            # Take an ADC sample
-            adc_counts = adc_counts + adc.read_u16()
-            
-            # One sample was taken, decrement the number of remaining samples
-            samples_remaining = samples_remaining - 1
-            
-            # If no more samples are needed, deinitialize the timer
-            if samples_remaining == 0:
-                timer.deinit()
-                
-        # Create the timer object and begin acquiring ADC readings
-        Timer(-1).init(mode=Timer.PERIODIC, freq=self.local_adc_read_frequency, callback=timer_callback)
+        return self._read_ADC_polled(channel)
+    
+    
+    def _read_ADC_DMA(self, channel: int):
+        # Take self.adc_read_samples samples from the specified ADC channel using DMA
+        buffer = self._adc_buffer
+        self._capture_ADC_DMA(_ADC_CS_EN | (channel << _ADC_CS_AINSEL_SHIFT), buffer, self._adc_dma_div)
         
-        # Wait until all samples have been taken
-        while samples_remaining > 0:
-            pass
+        # Once all samples have been taken successfully, return their sum (the FIFO holds raw 12-bit samples)
+        return sum(buffer)
+    
+    
+    def _capture_ADC_DMA(self, cs: int, buffer: array, div: int):
+        # Fill the buffer with ADC samples, using the specified ADC control and status register value (which selects
+        # the ADC channel(s) to sample) and clock divider register value (which sets the sample rate, see _adc_div())
+        
+        # Select the ADC channel, and set the sample rate
+        mem32[_ADC_CS] = cs
+        mem32[_ADC_DIV] = div
+        
+        # Enable the ADC FIFO with a DMA request for each sample (also clearing any under/overflow flags), and empty it
+        mem32[_ADC_FCS] = _ADC_FCS_EN | _ADC_FCS_DREQ_EN | (1 << _ADC_FCS_THRESH_SHIFT) | _ADC_FCS_UNDER | _ADC_FCS_OVER
+        while not mem32[_ADC_FCS] & _ADC_FCS_EMPTY:
+            mem32[_ADC_FIFO]
         
-        # Once all samples have been taken successfully, return their scaled mean
-        return (adc_counts * 3.0) / (self.local_adc_read_samples * 65535)
+        # Copy samples from the ADC FIFO into the buffer, and start sampling
+        self._adc_dma.config(read=_ADC_FIFO, write=buffer, count=len(buffer), ctrl=self._adc_dma_ctrl, trigger=True)
+        mem32[_ADC_CS] = cs | _ADC_CS_START_MANY
+        
+        # Wait until all samples have been taken, halting the core in between interrupts
+        registers = self._adc_dma_registers
+        while registers[_DMA_CTRL_TRIG] & _DMA_CTRL_TRIG_BUSY:
+            idle()
+        
+        # Stop sampling (and round-robin channel selection), and discard any samples taken after the transfer finished
+        # so that single reads still work
+        mem32[_ADC_CS] = _ADC_CS_EN
+        while not mem32[_ADC_CS] & _ADC_CS_READY:
+            pass
+        while not mem32[_ADC_FCS] & _ADC_FCS_EMPTY:
+            mem32[_ADC_FIFO]
+        mem32[_ADC_FCS] = 0
+    
+    
+    def _read_ADC_polled(self, channel: int):
+        # Take self.adc_read_samples samples from the specified ADC channel one at a time. The caller is blocked until
+        # the read finishes either way, so the samples are simply taken in a loop, waiting between them to keep to
+        # self.local_adc_read_frequency (ADC conversions themselves only take a couple of microseconds)
+        return _sum_adc(_ADC_CS_EN | (channel << _ADC_CS_AINSEL_SHIFT), self.local_adc_read_samples,
+                        1000000 // self.local_adc_read_frequency)
 
 
     def read_ADC_5V(self):
-        return self._read_ADC(self.adc_sense_5V)
+        return self._read_ADC(self.adc_channel_sense_5V)
 
 
     def read_ADC_24V(self):
-        return self._read_ADC(self.adc_sense_24V)
+        return self._read_ADC(self.adc_channel_sense_24V)
+
+
+    def read_ADC_both(self):
+        # Read the 5V and 24V sense lines together, returned as a (5V, 24V) tuple of raw ADC count sums
+        cs_5V = _ADC_CS_EN | (self.adc_channel_sense_5V << _ADC_CS_AINSEL_SHIFT)
+        
+        # Without DMA, alternate between single conversions on each channel, so that both channels are still sampled
+        # at self.local_adc_read_frequency over the time it would take to read one of them
+        if self._adc_dma_div_both is None:
+            adc_counts = self._adc_counts_both
+            _sum_adc_both(cs_5V, _ADC_CS_EN | (self.adc_channel_sense_24V << _ADC_CS_AINSEL_SHIFT),
+                          self.local_adc_read_samples, 1000000 // self.local_adc_read_frequency, adc_counts)
+            return (adc_counts[0], adc_counts[1])
+        
+        # Sample both channels in a single DMA pass by alternating between them, starting with the 5V channel; each
+        # channel is still sampled at self.local_adc_read_frequency
+        buffer = self._adc_buffer_both
+        cs = cs_5V | (((1 << self.adc_channel_sense_5V) | (1 << self.adc_channel_sense_24V)) << _ADC_CS_RROBIN_SHIFT)
+        self._capture_ADC_DMA(cs, buffer, self._adc_dma_div_both)
+        
+        # Even samples are from the 5V channel, and odd samples are from the 24V channel
+        counts_5V = _sum_even_samples(buffer, len(buffer))
+        counts_24V = sum(buffer) - counts_5V
+        
+        return (counts_5V, counts_24V)
     
     
     def set_status_LED(self, blink_LED: bool, blink_rate: int = None):
         # If blink_LED is True, start blinking at blink_rate
         if blink_LED:
-            def blink_callback(_):
-                self.pin_led.toggle()
-                
-            self.status_LED_timer = Timer(-1)
-            self.status_LED_timer.init(mode=Timer.PERIODIC, freq=blink_rate*2, callback=blink_callback)
+            if self.status_LED_state_machine is not None:
+                state_machine = self.status_LED_state_machine
+                state_machine.init(_blink_program, freq=_LED_PIO_FREQUENCY, set_base=self.pin_led)
+                state_machine.put(max(_LED_PIO_FREQUENCY // (64 * blink_rate) - 1, 0))
+                state_machine.active(1)
+            else:
+                self.status_LED_timer.init(mode=Timer.PERIODIC, freq=blink_rate*2, callback=self._status_LED_timer_callback)
+            self._status_LED_blinking = True
             
-        # Otherwise, clear the timer and leave the LED on to indicate power present
+        # Otherwise, stop blinking and leave the LED on to indicate power present
         else:
-            if self.status_LED_timer is not None:
-                self.status_LED_timer.deinit()
-                self.status_LED_timer = None
+            if self._status_LED_blinking:
+                if self.status_LED_state_machine is not None:
+                    # (the state machine still drives the LED pin once stopped, so set it from there)
+                    self.status_LED_state_machine.active(0)
+                    self.status_LED_state_machine.exec("set(pins, 1)")
+                else:
+                    self.status_LED_timer.deinit()
+                self._status_LED_blinking = False
                 
-            self.pin_led.high()
\ No newline at end of file
+            self.pin_led.high()
+    
+    
+    def _toggle_status_LED(self, timer: Timer):
+        self.pin_led.toggle()
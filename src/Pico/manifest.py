@@ -0,0 +1,10 @@
+# MicroPython manifest for freezing the Pico code into the firmware image, so that it is run from flash instead of
+# being compiled into RAM on every boot. Build the firmware from the MicroPython rp2 port directory with:
+#   make BOARD=RPI_PICO FROZEN_MANIFEST=/path/to/src/Pico/manifest.py
+
+# Keep the modules normally frozen into the board's firmware
+include("$(PORT_DIR)/boards/manifest.py")
+
+module("main.py")
+module("i2c_devices.py")
+module("update_MCP_addresses.py")
@@ -1,11 +1,23 @@
 import main
-import time
 from machine import Pin
 import micropython
+from micropython import const
+from array import array
 
-micropython.alloc_emergency_exception_buf(100)
+# On the RP2040, the SCL clock edges are counted in hardware with PIO instead of with a Python interrupt handler
+try:
+    import rp2
+except ImportError:
+    rp2 = None
 
-_default_MCP_address = 0b1100000
+_DEFAULT_MCP_ADDRESS = const(0b1100000)
+
+# The update command's second byte ends on this falling edge of SCL, which is when LDAC must be pulled low
+_LDAC_CLOCK_CYCLE = const(18)
+# Buffer for the address update command, allocated once and filled in for each update
+_update_command = bytearray(4)
+# The PIO state machine used to count SCL clock edges (PIO1, so that PIO0 is left free for the main codebase)
+_LDAC_STATE_MACHINE_ID = const(4)
 
 
 # In order to program the MCP DACs' I2C addresses correctly, an external NPN transistor must temporarily be soldered to
@@ -15,7 +27,7 @@ _default_MCP_address = 0b1100000
 #     to the transistor pin to make connection to the relevant LDAC signal easy.
 #   - Emitter: connect to GND on the board. The Pico's pins themselves act as convenient solder points.
 #   - Base: connect to the Pico GPIO pin specified below. Make sure this GPIO isn't being used for anything else!
-transistor_base_pin = 11
+_TRANSISTOR_BASE_PIN = const(11)
 
 # The main codebase expects the following mappings for MCP chips to I2C addresses, and you should program the MCPs as-
 # such:
@@ -28,59 +40,98 @@ transistor_base_pin = 11
 #   U10_7: 0x67
 
 
+if rp2 is not None:
+    @rp2.asm_pio(set_init=rp2.PIO.OUT_LOW)
+    def _LDAC_program():
+        # Wait for the number of falling edges on the input pin (SCL) pushed to the state machine, then set the output
+        # pin (the transistor base) high to pull LDAC low
+        pull()
+        mov(x, osr)
+        label("count_edge")
+        wait(1, pin, 0)
+        wait(0, pin, 0)
+        jmp(x_dec, "count_edge")
+        set(pins, 1)
+        label("done")
+        jmp("done")
+
+else:
+    # The number of SCL clock cycles left to count, and the transistor base pin to set once they have been counted; the
+    # interrupt handler is compiled with viper, so these are kept at module level instead of in a closure
+    _LDAC_cycles_remaining = array('i', [0])
+    _LDAC_pin = None
+    
+    @micropython.viper
+    def _callback_LDAC(interrupt_pin):
+        # Count the current clock cycle
+        cycles_remaining = ptr32(_LDAC_cycles_remaining)
+        cycles_remaining[0] = cycles_remaining[0] - 1
+        
+        # If the required number of clock cycles have been counted, pull the LDAC pin low
+        if cycles_remaining[0] == 0:
+            _LDAC_pin.high()
+            interrupt_pin.irq(handler=None)
+
+
 def update_MCP_address(board: main.main, current_address: int, new_address: int):
+    global _LDAC_pin
+    
     # Make sure the current and new addresses are both valid
     for address in (current_address, new_address):
-        if not (address >= _default_MCP_address and address <= _default_MCP_address + 7):
+        if not (address >= _DEFAULT_MCP_ADDRESS and address <= _DEFAULT_MCP_ADDRESS + 7):
             raise ValueError("Illegal address specified: " + str(address))
         
     # Set up the transistor base pin as an output to control the LDAC signal
-    pin_inv_LDAC = Pin(transistor_base_pin, Pin.OUT)
+    pin_inv_LDAC = Pin(_TRANSISTOR_BASE_PIN, Pin.OUT)
     pin_inv_LDAC.low()
     
     # Construct the command which will be used to update the address
     # See Figure 5-11 of the MCP4728 datasheet for details
-    update_command = bytes([
-        0b01100001 + ((current_address - _default_MCP_address) << 2),
-        0b01100010 + ((new_address - _default_MCP_address) << 2),
-        0b01100011 + ((new_address - _default_MCP_address) << 2),
-        0b11111111])
+    _update_command[0] = 0b01100001 + ((current_address - _DEFAULT_MCP_ADDRESS) << 2)
+    _update_command[1] = 0b01100010 + ((new_address - _DEFAULT_MCP_ADDRESS) << 2)
+    _update_command[2] = 0b01100011 + ((new_address - _DEFAULT_MCP_ADDRESS) << 2)
+    _update_command[3] = 0b11111111
     
-    # Create a callback function which will prompt the user to pull the LDAC pin low when needed
-    clock_cycles_remaining = 18
-    def callback_LDAC(interrupt_pin: Pin):
-        # Count the current clock cycle
-        nonlocal clock_cycles_remaining, pin_inv_LDAC
-        clock_cycles_remaining = clock_cycles_remaining - 1
+    # Wait for the user before counting any clock cycles, so that no stray SCL edges are counted while waiting
+    input("Please connect the collector of the external NPN transistor to the target device's LDAC pin. When you have done this, press Enter to continue...")
+    
+    # If PIO is available, count SCL clock cycles in hardware and drive the transistor base pin from there; the count
+    # pushed is one less than the number of edges, since the loop exits once the counter has already reached zero
+    if rp2 is not None:
+        LDAC_state_machine = rp2.StateMachine(_LDAC_STATE_MACHINE_ID, _LDAC_program, in_base=board.pin_scl,
+                                              set_base=pin_inv_LDAC)
+        LDAC_state_machine.active(1)
+        LDAC_state_machine.put(_LDAC_CLOCK_CYCLE - 1)
         
-        # If the required number of clock cycles have been counted, pull the LDAC pin low
-        if clock_cycles_remaining == 0:
-            pin_inv_LDAC.high()
-            interrupt_pin.irq(handler=None)
-            
-    # Register the callback function
-    board.pin_scl.irq(handler=callback_LDAC, trigger=Pin.IRQ_FALLING, hard=True)
-    time.sleep_ms(10)
+    # Otherwise, register an interrupt handler which will pull the LDAC pin low when needed
+    else:
+        LDAC_state_machine = None
+        _LDAC_cycles_remaining[0] = _LDAC_CLOCK_CYCLE
+        _LDAC_pin = pin_inv_LDAC
+        board.pin_scl.irq(handler=_callback_LDAC, trigger=Pin.IRQ_FALLING, hard=True)
     
-    # Execute the update command
-    input("Please connect the collector of the external NPN transistor to the target device's LDAC pin. When you have done this, press Enter to continue...")
-    board.i2c.writeto(current_address, update_command)
+    # Execute the update command immediately after the clock cycle counter is set up
+    board.i2c.writeto(current_address, _update_command)
+    
+    # The state machine has finished once the command has been sent, so stop it (the transistor base pin is left high)
+    if LDAC_state_machine is not None:
+        LDAC_state_machine.active(0)
     
     
 if __name__ == "__main__":
     # Set up I2C and scan for current devices
     board = main.main(local_adc_read_samples = 10, local_adc_read_frequency = 10, i2c_frequency = 10000)
-    current_devices = board.i2c.scan()
-    print(f"The following device addresses are currently in use: {list(hex(address) for address in current_devices)}")
+    current_devices = set(board.i2c.scan())
+    print(f"The following device addresses are currently in use: {', '.join(hex(address) for address in sorted(current_devices))}")
     
     # Update the address of a user-specified device
-    current_address = int(input(f"Enter current MCP I2C address (default is {hex(_default_MCP_address)}, range is [{hex(_default_MCP_address)}, {hex(_default_MCP_address + 7)}]): "))
-    new_address = int(input(f"Enter new MCP I2C address (range is [{hex(_default_MCP_address)}, {hex(_default_MCP_address + 7)}]): "))
+    current_address = int(input(f"Enter current MCP I2C address (default is {hex(_DEFAULT_MCP_ADDRESS)}, range is [{hex(_DEFAULT_MCP_ADDRESS)}, {hex(_DEFAULT_MCP_ADDRESS + 7)}]): "))
+    new_address = int(input(f"Enter new MCP I2C address (range is [{hex(_DEFAULT_MCP_ADDRESS)}, {hex(_DEFAULT_MCP_ADDRESS + 7)}]): "))
     update_MCP_address(board, current_address, new_address)
     
     # Check to see if the device's I2C address was successfully updated
-    new_devices = board.i2c.scan()
-    print(f"The following device addresses are now detected: {list(hex(address) for address in new_devices)}")
+    new_devices = set(board.i2c.scan())
+    print(f"The following device addresses are now detected: {', '.join(hex(address) for address in sorted(new_devices))}")
     if not (new_address in current_devices):
         if new_address in new_devices:
             print(f"The target MCP's I2C address was successfully updated to {hex(new_address)}.")